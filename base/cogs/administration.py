@@ -2,23 +2,42 @@ import os
 import time
 import discord
 import typing
-from discord.ext import commands
+from discord.ext import commands, tasks
 from base.modules.access_checks import has_admin_role
+from base.modules.constants import LOG_PATH as path
 
 class AdminCog(commands.Cog, name="Administration Commands"):
   def __init__(self, bot):
     self.bot = bot
+    if not os.path.isdir(path):
+      os.mkdir(path)
+    self.dump_metrics.start()
+
+  def cog_unload(self):
+    self.dump_metrics.cancel()
+    try:
+      self.bot.command_metrics.dump(f"{path}/command_metrics.json")
+    except:
+      pass
+
+  @tasks.loop(minutes=10)
+  async def dump_metrics(self):
+    try:
+      self.bot.command_metrics.dump(f"{path}/command_metrics.json")
+    except Exception as e:
+      print(f"Could not dump the command metrics: {e}")
 
   async def cog_command_error(self, context, error):
-    if hasattr(context.command, "on_error"):
+    if hasattr(context.command, "on_error") or isinstance(error, commands.CommandOnCooldown):
       # This prevents any commands with local handlers being handled here.
+      # The rate limited invocations are answered by the bot's on_command_error.
       return
     if isinstance(error, commands.CheckFailure):
       await context.send(f"Sorry {context.author.mention}, but you do not have permission to execute that command.")
     elif isinstance(error, commands.UserInputError):
-      await context.send(f"Sorry {context.author.mention}, but I could not understand the arguments passed to `?{context.command.qualified_name}`.")
+      await context.send(f"Sorry {context.author.mention}, but I could not understand the arguments passed to `{context.prefix}{context.command.qualified_name}`.")
     elif isinstance(error, commands.MaxConcurrencyReached):
-      await context.send(f"Sorry {context.author.mention}, but only {error.number} user(s) can execute `?{context.command.qualified_name}` at the same time!")
+      await context.send(f"Sorry {context.author.mention}, but only {error.number} user(s) can execute `{context.prefix}{context.command.qualified_name}` at the same time!")
     else:
       await context.send(f"Sorry {context.author.mention}, something unexpected happened...")
 
@@ -71,6 +90,87 @@ class AdminCog(commands.Cog, name="Administration Commands"):
               "Name":_name}
     await self.bot.log_admin(context.guild, title=title, fields=fields, timestamp=context.message.created_at)
 
+  @commands.group(
+    name="stats",
+    brief="Shows bot internals",
+    case_insensitive=True,
+    invoke_without_command=True
+  )
+  @commands.is_owner()
+  async def _stats(self, context):
+    await context.send_help("stats")
+
+  @_stats.command(
+    name="commands",
+    brief="Shows command latencies",
+    help="Shows the latency, errors and time spent on the db and discord of each command since the start.\nParameters:\n  sort - total, count, errors or max (default total)",
+    usage="[sort=total]"
+  )
+  @commands.is_owner()
+  async def _stats_commands(self, context, sort="total"):
+    if sort not in ["total", "count", "errors", "max"]:
+      raise commands.UserInputError(f"cannot sort by {sort}")
+    metrics = self.bot.command_metrics
+    rows = metrics.summary(sort)
+    if not rows:
+      await context.send("No command has been executed yet.")
+      return
+    max_len = max(len(name) for name, stats in rows)
+    lines = [f"{'command':<{max_len}} {'count':>6} {'err':>4} {'avg ms':>7} {'p50':>6} {'p95':>6} {'max ms':>7} {'db %':>5} {'http %':>6}"]
+    for name, stats in rows:
+      p50, p95 = stats.percentile(50), stats.percentile(95)
+      lines.append(f"{name:<{max_len}} {stats.count:>6} {stats.errors:>4} {stats.total/stats.count*1000:>7.1f} "
+                   f"{p50 if p50 is not None else '>10s':>6} {p95 if p95 is not None else '>10s':>6} {stats.max*1000:>7.1f} "
+                   f"{100*stats.db/stats.total if stats.total else 0:>5.1f} {100*stats.http/stats.total if stats.total else 0:>6.1f}")
+    since = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(metrics.since))
+    msg = "\n".join(lines)
+    if len(msg) > 1900:
+      msg = msg[:1900] + "\n..."
+    await context.send(f"```Since {since} UTC (p50/p95 are bucket bounds in ms)\n{msg}```")
+
+  @_stats.command(
+    name="connection",
+    brief="Shows bootstraps and reconnects",
+  )
+  @commands.is_owner()
+  async def _stats_connection(self, context):
+    stats = self.bot.connection_stats
+    uptime = time.time() - self.bot.start_at if hasattr(self.bot, "start_at") else 0
+    await context.send(f"```Uptime: {uptime/3600:.1f}h\nBootstraps: {stats['bootstrap']}\n"
+                       f"Reconnects (ready): {stats['ready']}\nResumed sessions: {stats['resumed']}```")
+
+  @_stats.command(
+    name="startup",
+    brief="Shows the startup timeline",
+  )
+  @commands.is_owner()
+  async def _stats_startup(self, context):
+    await context.send(f"```{self.bot.startup_report(slowest=20)[:1990]}```")
+
+  @_stats.command(
+    name="requests",
+    brief="Shows the queueing of discord requests",
+    help="Shows how many discord requests of each priority had to wait for the scheduler and for how long.",
+  )
+  @commands.is_owner()
+  async def _stats_requests(self, context):
+    scheduler = self.bot.request_scheduler
+    lines = [f"{'priority':<10} {'count':>7} {'queued':>7} {'avg ms':>7} {'max ms':>7}"]
+    for name, stats in scheduler.stats.items():
+      lines.append(f"{name:<10} {stats.count:>7} {stats.queued:>7} {stats.delay/stats.queued*1000 if stats.queued else 0:>7.1f} {stats.max_delay*1000:>7.1f}")
+    lines.append(f"In flight: {scheduler.in_flight} in {len(scheduler.buckets)} bucket(s), waiting: {scheduler.waiting}")
+    await context.send("```" + "\n".join(lines) + "```")
+
+  @_stats.command(
+    name="logs",
+    brief="Shows the log queue of this guild",
+  )
+  @commands.is_owner()
+  async def _stats_logs(self, context):
+    stats = self.bot.get_log_queue(context.guild).stats()
+    await context.send(f"```Queued: {stats['queued']}\nSent embeds: {stats['sent']} in {stats['messages']} message(s)\n"
+                       f"Failed embeds: {stats['failed']}\nWaited for space: {stats['waited']}```")
+
   @commands.command(
     name="eval",
     brief="Evaluates python expression",
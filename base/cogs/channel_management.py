@@ -1,4 +1,5 @@
 from datetime import datetime
+import asyncio
 import json
 import os
 import discord
@@ -8,6 +9,7 @@ from base.modules.constants import CACHE_PATH as path
 from base.modules.message_helper import save_message
 
 class ChannelManagementCog(commands.Cog, name="Channel Management Commands"):
+  request_priority = "moderation" # the discord requests of these commands are scheduled first
   def __init__(self, bot):
     self.bot = bot
     self.monitor = {}
@@ -23,7 +25,8 @@ class ChannelManagementCog(commands.Cog, name="Channel Management Commands"):
     except:
       pass
     for guild in self.bot.guilds:
-      self.init_guild(guild)
+      if self.bot.is_initialized(guild): # the other guilds call init_guild when they are initialized
+        self.init_guild(guild)
     
   def init_guild(self, guild):
     if guild.id not in self.monitor:
@@ -37,15 +40,16 @@ class ChannelManagementCog(commands.Cog, name="Channel Management Commands"):
       pass
 
   async def cog_command_error(self, context, error):
-    if hasattr(context.command, "on_error"):
+    if hasattr(context.command, "on_error") or isinstance(error, commands.CommandOnCooldown):
       # This prevents any commands with local handlers being handled here.
+      # The rate limited invocations are answered by the bot's on_command_error.
       return
     if isinstance(error, commands.MissingPermissions):
       await context.send(f"Sorry {context.author.mention}, but you do not have permission to execute that command!")
     elif isinstance(error, commands.BotMissingPermissions):
       await context.send(f"Sorry {context.author.mention}, but I do not have permission to execute that command!")
     elif isinstance(error, commands.UserInputError):
-      await context.send(f"Sorry {context.author.mention}, but I could not understand the arguments passed to `?{context.command.qualified_name}`.")
+      await context.send(f"Sorry {context.author.mention}, but I could not understand the arguments passed to `{context.prefix}{context.command.qualified_name}`.")
     elif isinstance(error, commands.CheckFailure):
       await context.send(f"Sorry {context.author.mention}, but you do not have permission to execute that command!")
     else:
@@ -53,7 +57,8 @@ class ChannelManagementCog(commands.Cog, name="Channel Management Commands"):
       
   @commands.Cog.listener()
   async def on_message(self, message):
-    if message.channel.id in self.monitor[message.channel.guild.id]:
+    # the cogs are loaded before the guilds are initialized, a guild has no entry until init_guild
+    if message.guild is not None and message.channel.id in self.monitor.get(message.guild.id, ()):
       await save_message(self.bot, message)
 
   @commands.group(
@@ -222,6 +227,33 @@ class ChannelManagementCog(commands.Cog, name="Channel Management Commands"):
               "Channel":f"{context.message.channel.mention}\n{context.message.channel}"}
     await self.bot.log_mod(context.guild, title=title, fields=fields, timestamp=context.message.created_at)
 
+  @_channel.command(
+    name="mutesync",
+    brief="Syncs the mute role's permissions",
+    help="Sets the overwrite of the mute role in every channel where it is missing or different. "
+         "The sync runs in the background; use the command again to see its progress.",
+  )
+  @commands.has_permissions(manage_channels=True, manage_roles=True)
+  @commands.bot_has_permissions(manage_channels=True, manage_roles=True)
+  @has_mod_role()
+  async def _channel_mutesync(self, context):
+    mute_role = self.bot.get_mute_role(context.guild)
+    if mute_role is None:
+      await context.send("There is no mute role.")
+      return
+    job = self.bot.permission_jobs.get(context.guild, mute_role)
+    if job is not None and job.is_running():
+      await context.send(f"The mute role is being synced: {job.progress()}.")
+      return
+    job = self.bot.permission_jobs.start(context.guild, mute_role, self.bot.get_mute_overwrite())
+    await context.send(f"Syncing the mute role in {job.total} channels.")
+    title = "Mute Role Sync"
+    fields = {"User":f"{context.author.mention}\n{context.author}",
+              "Role":f"{mute_role.mention}"}
+    await self.bot.log_mod(context.guild, title=title, fields=fields, timestamp=context.message.created_at)
+    await asyncio.shield(job.task) # the sync continues if this command is cancelled
+    await context.send(f"Finished syncing the mute role: {job.progress()}.")
+
 def setup(bot):
   bot.add_cog(ChannelManagementCog(bot))
   print("Added channel management.")
@@ -1,22 +1,52 @@
+import time
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from base.modules.access_checks import has_admin_role, can_edit_commands
 from base.modules.custom_commands import json_load_dict, get_cmd_attributes, set_new_cmd
 from base.modules.basic_converter import cmd_name_converter, cmd_add_converter
+from base.modules.command_usage import CommandUsage, load_usage
 import json
 
 class CommandCog(commands.Cog, name="Command Management"):
   def __init__(self, bot):
     self.bot = bot
+    self.usage = CommandUsage()
+    self.flush_usage.start()
+
+  def cog_unload(self):
+    self.flush_usage.cancel()
+    for guild_id in list(self.usage.pending):
+      if guild_id in self.bot.db:
+        try:
+          self.usage.flush(guild_id, self.bot.db[guild_id])
+        except Exception as e:
+          print(f"Could not save the command usage of guild {guild_id}: {e}")
+
+  @tasks.loop(minutes=5)
+  async def flush_usage(self):
+    for guild in self.bot.guilds:
+      if guild.id in self.usage.pending and guild.id in self.bot.db:
+        try:
+          self.usage.flush(guild.id, self.bot.db[guild.id])
+        except Exception as error:
+          await self.bot.on_task_error("Save custom command usage", error, guild)
+
+  @commands.Cog.listener()
+  async def on_command_completion(self, context):
+    # only the custom commands have a template
+    command = context.invoked_subcommand if context.invoked_subcommand is not None else context.command
+    if context.guild is not None and hasattr(command, "template"):
+      self.usage.record(context.guild.id, command.qualified_name)
 
   async def cog_command_error(self, context, error):
-    if hasattr(context.command, "on_error"):
+    if hasattr(context.command, "on_error") or isinstance(error, commands.CommandOnCooldown):
       # This prevents any commands with local handlers being handled here.
+      # The rate limited invocations are answered by the bot's on_command_error.
       return
     if isinstance(error, commands.CheckFailure):
       await context.send(f"Sorry {context.author.mention}, but you do not have permission to execute that command.")
     elif isinstance(error, commands.UserInputError):
-      await context.send(f"Sorry {context.author.mention}, but I could not understand the arguments passed to `?{context.command.qualified_name}`:\n{error}")
+      await context.send(f"Sorry {context.author.mention}, but I could not understand the arguments passed to `{context.prefix}{context.command.qualified_name}`:\n{error}")
     elif isinstance(error, commands.CommandInvokeError) and isinstance(error.original, commands.CommandRegistrationError):
       await context.send(f"Sorry {context.author.mention}, but your operation failed:\n{error.original}")
     elif isinstance(error, commands.CommandInvokeError) and isinstance(error.original, (NameError, LookupError)):
@@ -37,7 +67,7 @@ class CommandCog(commands.Cog, name="Command Management"):
   @_cmd.command(
     name="add",
     brief="Adds a command to the bot.",
-    help="Adds a new permanent command to the bot. The command will send the text, when ?name is invoked. String key-value pairs are supported and will be passed to the command, but name attribute will be ignored. You MUST add a new line between the key-value pairs, and MUST NOT add a new line inside the key-value pairs (except cmd_text), the last key MUST be cmd_text which is the text sent by the command.",
+    help="Adds a new permanent command to the bot. The command will send the text, when the command name is invoked. String key-value pairs are supported and will be passed to the command, but name attribute will be ignored. You MUST add a new line between the key-value pairs, and MUST NOT add a new line inside the key-value pairs (except cmd_text), the last key MUST be cmd_text which is the text sent by the command. The text can contain the placeholders {author}, {mention}, {channel}, {guild}, {args}, {arg0}, {arg1}..., {count} (the number of invocations of the command) and {random:a|b|c}, use {{ and }} for literal braces. The attributes rate, per and bucket (user, channel or guild) limit the command to rate invocations per `per` seconds.",
     usage="<cmd_name> [attribute=value]... [cmd_text=value]"
   )
   @can_edit_commands()
@@ -45,14 +75,14 @@ class CommandCog(commands.Cog, name="Command Management"):
     attributes, cmd_text = cmd_args
     if not cmd_text:
       raise commands.UserInputError("Unexpected format, no text found for the command")
-    parent, child, cmd_name = get_cmd_attributes(self.bot, cmd_name, False)
+    parent, child, cmd_name = get_cmd_attributes(self.bot.get_guild_commands(context.guild), cmd_name, False)
     set_new_cmd(parent, child, cmd_text, attributes, False)
     await self.after_cmd_update(context, cmd_name, cmd_text, attributes, False, "Added Command")
     
   @_cmd.command(
     name="gadd",
     brief="Adds a command group to the bot.",
-    help="Adds a new permanent command group to the bot. The command will send the text or send the help if text is empty, when ?name is invoked. String key-value pairs are supported and will be passed to the command, but name attribute will be ignored. You MUST add a new line between the key-value pairs, and MUST NOT add a new line inside the key-value pairs (except cmd_text), the last key MUST be cmd_text which is the text sent by the command.",
+    help="Adds a new permanent command group to the bot. The command will send the text or send the help if text is empty, when the command name is invoked. String key-value pairs are supported and will be passed to the command, but name attribute will be ignored. You MUST add a new line between the key-value pairs, and MUST NOT add a new line inside the key-value pairs (except cmd_text), the last key MUST be cmd_text which is the text sent by the command. The text can contain the placeholders {author}, {mention}, {channel}, {guild}, {args}, {arg0}, {arg1}..., {count} (the number of invocations of the command) and {random:a|b|c}, use {{ and }} for literal braces. The attributes rate, per and bucket (user, channel or guild) limit the command to rate invocations per `per` seconds.",
     usage="<cmd_name> [attribute=value]... [cmd_text=value]"
   )
   @can_edit_commands()
@@ -62,7 +92,7 @@ class CommandCog(commands.Cog, name="Command Management"):
       cmd_text = ""
     else:
       attributes, cmd_text = cmd_args
-    parent, child, cmd_name = get_cmd_attributes(self.bot, cmd_name, False)
+    parent, child, cmd_name = get_cmd_attributes(self.bot.get_guild_commands(context.guild), cmd_name, False)
     set_new_cmd(parent, child, cmd_text, attributes, True)
     await self.after_cmd_update(context, cmd_name, cmd_text, attributes, True, "Added Command Group")
     
@@ -72,8 +102,8 @@ class CommandCog(commands.Cog, name="Command Management"):
   )
   @can_edit_commands()
   async def _rename_cmd(self, context, cmd_name:cmd_name_converter, new_name:cmd_name_converter):
-    parent, child, cmd_name = get_cmd_attributes(self.bot, cmd_name, True)
-    new_parent, new_child, new_name = get_cmd_attributes(self.bot, new_name, False)
+    parent, child, cmd_name = get_cmd_attributes(self.bot.get_guild_commands(context.guild), cmd_name, True)
+    new_parent, new_child, new_name = get_cmd_attributes(self.bot.get_guild_commands(context.guild), new_name, False)
     cmd = self.bot.db[context.guild.id].select("user_commands", cmd_name)
     if cmd is not None:
       if cmd["lock"]:
@@ -88,6 +118,12 @@ class CommandCog(commands.Cog, name="Command Management"):
             new_cmd.add_command(command)
             self.bot.db[context.guild.id].query(f"UPDATE user_commands SET cmdname='{new_name} {command.name}' WHERE cmdname='{cmd_name} {command.name}'")
         self.bot.db[context.guild.id].query(f"UPDATE user_commands SET cmdname='{new_name}' WHERE cmdname='{cmd_name}' ")
+        # the usage follows the renamed command and its subcommands
+        self.usage.flush(context.guild.id, self.bot.db[context.guild.id])
+        self.bot.db[context.guild.id].query(
+          "UPDATE user_command_usage SET cmdname = ? || substr(cmdname, ?) WHERE cmdname = ? OR substr(cmdname, 1, ?) = ?",
+          (new_name, len(cmd_name)+1, cmd_name, len(cmd_name)+1, f"{cmd_name} "))
+        self.usage.discard(context.guild.id, cmd_name)
         await self.log_cmd_update(context, new_name, cmd["message"], attributes, cmd["isgroup"], "Renamed Command")
       except Exception as e:
         parent.add_command(old_cmd)
@@ -104,7 +140,7 @@ class CommandCog(commands.Cog, name="Command Management"):
   @can_edit_commands()
   async def _update_cmd(self, context, cmd_name:cmd_name_converter, *, cmd_args:cmd_add_converter):
     attributes_new, cmd_text = cmd_args
-    parent, child, cmd_name = get_cmd_attributes(self.bot, cmd_name, True)
+    parent, child, cmd_name = get_cmd_attributes(self.bot.get_guild_commands(context.guild), cmd_name, True)
     cmd = self.bot.db[context.guild.id].select("user_commands", cmd_name)
     if cmd is not None:
       if cmd["lock"]:
@@ -125,7 +161,7 @@ class CommandCog(commands.Cog, name="Command Management"):
   )
   @can_edit_commands()
   async def _rm_cmd(self, context, cmd_name:cmd_name_converter):
-    parent, child, cmd_name = get_cmd_attributes(self.bot, cmd_name, True, True)
+    parent, child, cmd_name = get_cmd_attributes(self.bot.get_guild_commands(context.guild), cmd_name, True, True)
     cmd = self.bot.db[context.guild.id].select("user_commands", cmd_name)
     if cmd is not None:
       if cmd["lock"]:
@@ -137,6 +173,8 @@ class CommandCog(commands.Cog, name="Command Management"):
           raise LookupError(f"Custom command '{cmd_name}' cannot be removed because it has at least one child in db.")
       parent.remove_command(child)
       self.bot.db[context.guild.id].delete_row("user_commands", cmd_name)
+      self.usage.discard(context.guild.id, cmd_name)
+      self.bot.db[context.guild.id].query("DELETE FROM user_command_usage WHERE cmdname = ?", (cmd_name,))
       await self.log_cmd_update(context, cmd_name, cmd["message"], {}, cmd["isgroup"], "Removed Command")
     else:
       raise LookupError(f"Custom command '{cmd_name}' not found.")
@@ -150,7 +188,7 @@ class CommandCog(commands.Cog, name="Command Management"):
   async def _alias_cmd(self, context, cmd_name:cmd_name_converter, *aliases):
     if len(aliases) == 0:
       raise commands.UserInputError("aliases is a required argument that is missing.")
-    parent, child, cmd_name = get_cmd_attributes(self.bot, cmd_name, True)
+    parent, child, cmd_name = get_cmd_attributes(self.bot.get_guild_commands(context.guild), cmd_name, True)
     cmd = self.bot.db[context.guild.id].select("user_commands", cmd_name)
     if cmd is not None:
       if cmd["lock"]:
@@ -170,7 +208,7 @@ class CommandCog(commands.Cog, name="Command Management"):
   )
   @has_admin_role()
   async def _lock_cmd(self, context, cmd_name:cmd_name_converter):
-    parent, child, cmd_name = get_cmd_attributes(self.bot, cmd_name, True)
+    parent, child, cmd_name = get_cmd_attributes(self.bot.get_guild_commands(context.guild), cmd_name, True)
     cmd = self.bot.db[context.guild.id].select("user_commands", cmd_name)
     if cmd is not None:
       self.bot.db[context.guild.id].query(f"UPDATE user_commands SET lock=1 WHERE cmdname='{cmd_name}'")
@@ -188,7 +226,7 @@ class CommandCog(commands.Cog, name="Command Management"):
   )
   @has_admin_role()
   async def _unlock_cmd(self, context, cmd_name:cmd_name_converter):
-    parent, child, cmd_name = get_cmd_attributes(self.bot, cmd_name, True)
+    parent, child, cmd_name = get_cmd_attributes(self.bot.get_guild_commands(context.guild), cmd_name, True)
     cmd = self.bot.db[context.guild.id].select("user_commands", cmd_name)
     if cmd is not None:
       self.bot.db[context.guild.id].query(f"UPDATE user_commands SET lock=0 WHERE cmdname='{cmd_name}'")
@@ -200,6 +238,32 @@ class CommandCog(commands.Cog, name="Command Management"):
     else:
       raise LookupError(f"Custom command '{cmd_name}' not found.")
 
+  @_cmd.command(
+    name="stats",
+    brief="Shows the usage of the custom commands.",
+    help="Lists the custom commands starting with the least used ones, so unused commands can be removed.\nParameters:\n  limit - the max number of listed commands (default 20)",
+    aliases=["usage"]
+  )
+  @can_edit_commands()
+  async def _stats_cmd(self, context, limit:int=20):
+    db = self.bot.db[context.guild.id]
+    self.usage.flush(context.guild.id, db)
+    rows = load_usage(db)
+    if not rows:
+      await context.send("There are no custom commands.")
+      return
+    unused = sum(1 for cmdname, count, last_used in rows if count == 0)
+    shown = rows[:max(limit, 1)]
+    max_len = max(len(cmdname) for cmdname, count, last_used in shown)
+    lines = [f"{len(rows)} custom command(s), {unused} never used:"]
+    for cmdname, count, last_used in shown:
+      last = time.strftime('%Y-%m-%d %H:%M', time.gmtime(last_used)) if last_used else "never"
+      lines.append(f"  {cmdname:<{max_len}} {count:>6} {last}")
+    msg = "\n".join(lines)
+    if len(msg) > 1994:
+      msg = msg[:1990] + "\n..."
+    await context.send(f"```{msg}```")
+
   async def after_cmd_update(self, context, cmd_name, cmd_text, attributes, isgroup, action):
     self.bot.db[context.guild.id].insert_or_update("user_commands", cmd_name, cmd_text, json.dumps(attributes), int(isgroup), 0)
     await self.log_cmd_update(context, cmd_name, cmd_text, attributes, isgroup, action)
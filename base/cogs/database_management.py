@@ -5,6 +5,7 @@ import discord
 from discord.ext import commands
 from base.modules.access_checks import has_admin_role
 from base.modules.constants import DB_PATH as path
+from base.modules.blob_store import blob_store
 
 #An extension for hero commands.
 class DatabaseManagementCog(commands.Cog, name="Database Commands"):
@@ -12,8 +13,9 @@ class DatabaseManagementCog(commands.Cog, name="Database Commands"):
     self.bot = bot
 
   async def cog_command_error(self, context, error):
-    if hasattr(context.command, "on_error"):
+    if hasattr(context.command, "on_error") or isinstance(error, commands.CommandOnCooldown):
       # This prevents any commands with local handlers being handled here.
+      # The rate limited invocations are answered by the bot's on_command_error.
       return
     if isinstance(error, commands.CheckFailure):
       await context.send(f"Sorry {context.author.mention}, but you do not have permission to manipulate the database.")
@@ -27,7 +29,7 @@ class DatabaseManagementCog(commands.Cog, name="Database Commands"):
       else:
         await context.send(f"Sorry {context.author.mention}, but {error.original}")
     elif isinstance(error, commands.UserInputError):
-      await context.send(f"Sorry {context.author.mention}, but I could not understand the arguments passed to `?{context.command.qualified_name}`.")
+      await context.send(f"Sorry {context.author.mention}, but I could not understand the arguments passed to `{context.prefix}{context.command.qualified_name}`.")
     else:
       await context.send(f"Sorry {context.author.mention}, something unexpected happened while modifying the database.")
 
@@ -66,7 +68,7 @@ class DatabaseManagementCog(commands.Cog, name="Database Commands"):
   @_db.command(
     name="insert",
     brief="Inserts or updates a row.",
-    help="Parameters:\n  name - the name of the table\n  primary_key - the value of the primary key\n  value1 value2 ... - the values of each column in the order as specified in the command: ?db info tablename",
+    help="Parameters:\n  name - the name of the table\n  primary_key - the value of the primary key\n  value1 value2 ... - the values of each column in the order shown by the command db info tablename",
     description="This command inserts or updates a row with the primary_key.\nUsage:",
     usage="name primary_key value1 value2 ...",
     aliases=["update", "set"]
@@ -198,6 +200,32 @@ class DatabaseManagementCog(commands.Cog, name="Database Commands"):
   async def _info(self, context, _name=None):
     await context.send(self.bot.db[context.guild.id].info(_name))
     
+  @_db.group(
+    name="blobs",
+    brief="Shows the attachment store",
+    help="Shows how many attachment files are stored and how often they are referenced by cached, scheduled and saved messages.",
+    invoke_without_command=True
+  )
+  @commands.is_owner()
+  async def _blobs(self, context):
+    stats = blob_store.stats()
+    await context.send(f"```Files: {stats['blobs']} ({stats['bytes']/1024/1024:.1f} MB)\n"
+                       f"Names: {stats['names']}\nReferences: {stats['references']}```")
+
+  @_blobs.command(
+    name="gc",
+    brief="Deletes unreferenced attachments",
+  )
+  @commands.max_concurrency(1)
+  @commands.is_owner()
+  async def _blobs_gc(self, context):
+    deleted, freed = blob_store.gc()
+    await context.send(f"```Deleted {deleted} file(s), freed {freed/1024/1024:.1f} MB```")
+    title = "User collected unreferenced attachments"
+    fields = {"User":f"{context.author.mention}\n{context.author}",
+              "Deleted":f"{deleted} file(s), {freed} bytes"}
+    await self.bot.log_admin(context.guild, title=title, fields=fields, timestamp=context.message.created_at)
+
   @_db.command(
     name="backup",
     brief="Backs up database",
@@ -223,7 +251,7 @@ class DatabaseManagementCog(commands.Cog, name="Database Commands"):
     if isinstance(error, commands.CheckFailure):
       await context.send(f"Sorry {context.author.mention}, but you do not have permission to backup data.")
     elif isinstance(error, commands.MaxConcurrencyReached):
-      await context.send(f"Sorry {context.author.mention}, but only {error.number} user(s) can execute `?{context.command.qualified_name}` at the same time!")
+      await context.send(f"Sorry {context.author.mention}, but only {error.number} user(s) can execute `{context.prefix}{context.command.qualified_name}` at the same time!")
     else:
       await context.send(f"Sorry {context.author.mention}, something unexpected happened while backing up data.")
 
@@ -1,4 +1,5 @@
 import time
+import asyncio
 import discord
 import json
 import os
@@ -12,6 +13,7 @@ from base.modules.constants import CACHE_PATH as path
 from base.modules.message_helper import get_message_attachments, send_temp_message, wait_user_confirmation,\
                                         save_message, get_message_brief, get_full_message, clean_message_files
 from base.modules.special_bot_methods import special_process_command, command_check
+from base.modules.activity_heatmap import ActivityHeatmap, render_heatmap, hour_of_week_name
 
 class MessageManagementCog(commands.Cog, name="Message Management Commands"):
   def __init__(self, bot):
@@ -20,14 +22,18 @@ class MessageManagementCog(commands.Cog, name="Message Management Commands"):
       os.mkdir(path)
     self.delete_cache = MessageCache.from_json(f'{path}/delete_cache.json')
     self.scheduler = MessageSchedule.from_json(f'{path}/scheduler.json')
+    self.heatmaps = {}
     for guild in self.bot.guilds:
-      self.init_guild(guild)
+      if self.bot.is_initialized(guild): # the other guilds call init_guild when they are initialized
+        self.init_guild(guild)
     
   def init_guild(self, guild):
     if guild.id not in self.delete_cache:
       self.delete_cache[guild.id] = []
     if guild.id not in self.scheduler:
       self.scheduler[guild.id] = []
+    if guild.id not in self.heatmaps:
+      self.heatmaps[guild.id] = ActivityHeatmap()
     # set up the timers for these schedulers
     for schedule in self.scheduler[guild.id]:
       schedule.set_timer(guild, self.bot, self.scheduler[guild.id])
@@ -51,15 +57,16 @@ class MessageManagementCog(commands.Cog, name="Message Management Commands"):
     return self.bot.get_setting(guild, "NUM_DELETE_CACHE")
 
   async def cog_command_error(self, context, error):
-    if hasattr(context.command, "on_error"):
+    if hasattr(context.command, "on_error") or isinstance(error, commands.CommandOnCooldown):
       # This prevents any commands with local handlers being handled here.
+      # The rate limited invocations are answered by the bot's on_command_error.
       return
     if isinstance(error, commands.BotMissingPermissions):
       await context.send(f"Sorry {context.author.mention}, but I do not have permission to manage messages!")
     elif isinstance(error, commands.CheckFailure):
       await context.send(f"Sorry {context.author.mention}, but you do not have permission to manage messages!")
     elif isinstance(error, commands.UserInputError):
-      await context.send(f"Sorry {context.author.mention}, but I could not understand the arguments passed to `?{context.command.qualified_name}`.")
+      await context.send(f"Sorry {context.author.mention}, but I could not understand the arguments passed to `{context.prefix}{context.command.qualified_name}`.")
     elif isinstance(error, commands.CommandInvokeError) and isinstance(error.original, discord.Forbidden):
       await context.send(f"Sorry {context.author.mention}, but I do not have permission to post in the specified channel.")
     else:
@@ -83,6 +90,7 @@ class MessageManagementCog(commands.Cog, name="Message Management Commands"):
       channel = context.channel
     max_cache = self.get_max_cache(context.guild)
     msg_list = []
+    caches = []
     msg_count = 0
     async for message in channel.history():
       if len(msg_list) >= num:
@@ -92,8 +100,12 @@ class MessageManagementCog(commands.Cog, name="Message Management Commands"):
       if len(members) == 0 or message.author in members:
         msg_count += 1
         if msg_count > skip_num: # skip the first m messages
-          await self.cache_message(message, max_cache)
+          cache = await self.cache_message(message, max_cache)
+          if cache is not None:
+            caches.append(cache)
           msg_list.append(message)
+    # the attachments are saved before the messages are deleted
+    missing = [file_name for files in await asyncio.gather(*[cache.wait_files() for cache in caches]) for file_name in files]
     await self.smart_delete_messages(channel, msg_list)
     title = f"Messages have been deleted"
     fields = {"User":f"{context.author.mention}\n{context.author}",
@@ -103,6 +115,8 @@ class MessageManagementCog(commands.Cog, name="Message Management Commands"):
     await self.bot.log_mod(context.guild, title=title, fields=fields, timestamp=context.message.created_at)
     if len(msg_list) == 0:
       await send_temp_message(context, "Could not delete message(s).", 10)
+    if missing:
+      await context.send(f"{context.author.mention} Could not save the attachment(s) {', '.join(missing)}, they cannot be restored.")
     await context.message.delete()
     
   async def smart_delete_messages(self, channel, msg_list):
@@ -117,15 +131,19 @@ class MessageManagementCog(commands.Cog, name="Message Management Commands"):
     await channel.delete_messages(bulk_msg)
     
   async def cache_message(self, message, max_cache):
+    # returns the cache of the message or None if it is not cached, its attachments are still downloading
     key = message.channel.guild.id
     if max_cache > 0 and (len(self.delete_cache[key]) < max_cache or (len(self.delete_cache[key]) > 0 and 
       time.mktime(message.created_at.timetuple()) > self.delete_cache[key][-1]["time"])):
       # do not need to cache the message if it's too old
-      self.delete_cache[key].append(await MessageCache.from_message(message))
+      cache = await MessageCache.from_message(message)
+      self.delete_cache[key].append(cache)
       self.delete_cache[key].sort(reverse=True) # the latest message should be at front
       if (len(self.delete_cache[key]) > max_cache):
         # remove the oldest message if it exceeds the max cache
         self.delete_cache[key].pop().del_files()
+      return cache
+    return None
     
         
   @_delete.command(
@@ -223,7 +241,12 @@ class MessageManagementCog(commands.Cog, name="Message Management Commands"):
   async def _announce(self, context, channel:typing.Optional[discord.TextChannel], *, announcement=None):
     if channel is None:
       channel = context.channel
-    (embed_post, files) = await get_message_attachments(context.message)
+    (embed_post, files, missing) = await get_message_attachments(context.message)
+    if missing: # the command message is kept, so the attachments are not lost
+      for file in files:
+        file.close()
+      await context.send(f"Sorry {context.author.mention}, but I could not download the attachment(s) {', '.join(missing)}, the announcement was not made.")
+      return
     if announcement is None and embed_post is None and len(files) == 0:
       await context.send_help("announce")
       return
@@ -259,8 +282,13 @@ class MessageManagementCog(commands.Cog, name="Message Management Commands"):
         msg_count += 1
         if msg_count > skip_num:
           queue.append(message)
+    missing = []
     for msg in reversed(queue):
-      await self.copy_message(channel, msg)
+      missing += await self.copy_message(channel, msg)
+    # a message with attachments which could not be copied is not deleted
+    kept_ids = {msg.id for msg, file_name in missing}
+    kept = [msg for msg in queue if msg.id in kept_ids]
+    queue = [msg for msg in queue if msg.id not in kept_ids]
     await self.smart_delete_messages(context.message.channel, queue)
     title = f"Messages have been moved"
     fields = {"User":f"{context.author.mention}\n{context.author}",
@@ -269,23 +297,28 @@ class MessageManagementCog(commands.Cog, name="Message Management Commands"):
               "To Channel":channel.mention,
               "Moved":f"{len(queue)} message(s)"}
     await self.bot.log_mod(context.guild, title=title, fields=fields, timestamp=context.message.created_at)
-    if len(queue) == 0:
+    if kept:
+      await context.send(f"{context.author.mention} Could not copy the attachment(s) {', '.join(file_name for msg, file_name in missing)}, "
+                         f"{len(kept)} message(s) were copied without them and not deleted: {' '.join(msg.jump_url for msg in kept)}")
+    elif len(queue) == 0:
       await send_temp_message(context, "Could not move message(s).", 10)
     await context.message.delete()
     
   async def copy_message(self, channel, message):
+    # returns (message, file name) of the attachments which could not be copied
     old_message = message.content
     content = old_message.replace('\n> ', '\n').replace('\n', '\n> ')
     if content:
       content = f"{message.author.mention} said in {message.channel.mention}:\n> {content}"
     else:
       content = f"{message.author.mention} said in {message.channel.mention}:"
-    (embedOrigin, files) = await get_message_attachments(message)
+    (embedOrigin, files, missing) = await get_message_attachments(message)
     await channel.send(
       content=content,
       embed=embedOrigin,
       files = files
     )
+    return [(message, file_name) for file_name in missing]
     
   @commands.group(
     name="edit",
@@ -431,6 +464,8 @@ class MessageManagementCog(commands.Cog, name="Message Management Commands"):
     if channel is None:
       channel = context.channel
     message_schedule = await MessageSchedule.from_message(context.message, channel, schedule, text)
+    # the attachments are saved before the command message is deleted
+    missing = await message_schedule.wait_files()
     self.scheduler[context.guild.id].append(message_schedule)
     message_schedule.set_timer(context.guild, self.bot, self.scheduler[context.guild.id])
     title = f"A message has been scheduled"
@@ -441,6 +476,10 @@ class MessageManagementCog(commands.Cog, name="Message Management Commands"):
               "Files":f"{len(message_schedule['files'])} file(s)" if message_schedule["files"] else None,
               "Time":schedule.strftime('%Y-%m-%d %H:%M:%S %z')}
     await self.bot.log_mod(context.guild, title=title, fields=fields, timestamp=context.message.created_at)
+    if missing: # the command message is kept, so the attachments are not lost
+      await context.send(f"{context.author.mention} You have scheduled a message at {schedule.strftime('%Y-%m-%d %H:%M:%S %z')}, "
+                         f"but I could not save the attachment(s) {', '.join(missing)}, they will not be sent.")
+      return
     await send_temp_message(context, f"{context.author.mention} You have scheduled a message at {schedule.strftime('%Y-%m-%d %H:%M:%S %z')}.", 10)
     await context.message.delete()
     
@@ -643,6 +682,9 @@ class MessageManagementCog(commands.Cog, name="Message Management Commands"):
         if msg_count > skip_num: # skip the first m messages
           await save_message(self.bot, message)
           saved += 1
+    if saved > 0:
+      # saved messages can be older than the last processed time of the heatmap
+      self.heatmaps[context.guild.id].reset()
     title = f"Messages have been saved"
     fields = {"User":f"{context.author.mention}\n{context.author}",
               "Author(s)":"\n".join([f"{member.mention} {member}" for member in members]) if members else None,
@@ -689,6 +731,7 @@ class MessageManagementCog(commands.Cog, name="Message Management Commands"):
       return
     clean_message_files(result)
     self.bot.db[context.guild.id].delete_row("messages", messageID)
+    self.heatmaps[context.guild.id].reset()
     await context.send(f"Message with ID {messageID} is deleted")
     title = f"User deleted a message"
     fields = {"User":f"{context.author.mention}\n{context.author}",
@@ -775,6 +818,7 @@ class MessageManagementCog(commands.Cog, name="Message Management Commands"):
         clean_message_files(row)
     # delete the messages in db
     self.bot.db[context.guild.id].query(f"DELETE FROM messages WHERE {where_clause}")
+    self.heatmaps[context.guild.id].reset()
     await context.send(f"{num[0][0]} message(s) have been deleted.")
     title = f"User purged messages"
     fields = {"User":f"{context.author.mention}\n{context.author}",
@@ -784,6 +828,39 @@ class MessageManagementCog(commands.Cog, name="Message Management Commands"):
               "Num":f"{num[0][0]} message(s)"}
     await self.bot.log_mod(context.guild, title=title, fields=fields, timestamp=context.message.created_at)
 
+  @_msg.command(
+    name="heatmap",
+    brief="Shows activity of messages in db",
+    help="Shows at which hours of the week (UTC) the messages in db were sent, combined over the given channels or all channels if none is specified. The busiest channels are listed below the heatmap.",
+    usage="[#channels]...",
+    aliases=["activity"]
+  )
+  @commands.has_permissions(read_messages=True, read_message_history=True, send_messages=True, manage_messages=True)
+  @commands.bot_has_permissions(read_messages=True, read_message_history=True, send_messages=True, manage_messages=True)
+  @has_mod_role()
+  async def _heatmap_msg(self, context, channels:commands.Greedy[discord.TextChannel]):
+    heatmap = self.heatmaps[context.guild.id]
+    heatmap.refresh(self.bot.db[context.guild.id])
+    channel_ids = set(channel.id for channel in channels) if channels else None
+    ranking = heatmap.ranking(channel_ids)
+    if not ranking or ranking[0][1] == 0:
+      await context.send("Message not found.")
+      return
+    embed = discord.Embed(
+      title=f"Message Activity",
+      description=f"```{render_heatmap(heatmap.combined(channel_ids))}```",
+      colour=discord.Colour.green(),
+      timestamp=context.message.created_at
+    )
+    for cid, total, busiest in ranking[:10]:
+      channel = context.guild.get_channel(cid)
+      embed.add_field(
+        name=f"#{channel.name if channel is not None else heatmap.names[cid]}",
+        value=f"{total} message(s)\nBusiest: {hour_of_week_name(busiest)} UTC"
+      )
+    embed.set_footer(text="MESSAGE HEATMAP")
+    await context.send(embed=embed)
+
 def setup(bot):
   bot.add_cog(MessageManagementCog(bot))
   print("Added message management.")
@@ -7,6 +7,7 @@ from discord.ext import commands
 from base.modules.constants import CACHE_PATH as path
 from base.modules.serializable_object import SecretChannelEntry
 from base.modules.async_timer import run_bot_coroutine
+from base.modules.access_checks import is_mod_or_admin
 
 class SecretChannelCog(commands.Cog, name="General Commands"):
   def __init__(self, bot):
@@ -16,7 +17,8 @@ class SecretChannelCog(commands.Cog, name="General Commands"):
       os.mkdir(path)
     self.secret_channels = SecretChannelEntry.from_json(f'{path}/secret_channels.json')
     for guild in self.bot.guilds:
-      self.init_guild(guild)
+      if self.bot.is_initialized(guild): # the other guilds call init_guild when they are initialized
+        self.init_guild(guild)
     
   def init_guild(self, guild):
     if guild.id not in self.secret_channels:
@@ -35,8 +37,9 @@ class SecretChannelCog(commands.Cog, name="General Commands"):
       pass
 
   async def cog_command_error(self, context, error):
-    if hasattr(context.command, "on_error"):
+    if hasattr(context.command, "on_error") or isinstance(error, commands.CommandOnCooldown):
       # This prevents any commands with local handlers being handled here.
+      # The rate limited invocations are answered by the bot's on_command_error.
       return
     if isinstance(error, commands.MissingPermissions):
       await context.send(f"Sorry {context.author.mention}, but you do not have permission to execute that command!")
@@ -45,7 +48,7 @@ class SecretChannelCog(commands.Cog, name="General Commands"):
     elif isinstance(error, commands.CheckFailure):
       await context.send(f"Sorry {context.author.mention}, but you do not have permission to execute that command!")
     elif isinstance(error, commands.UserInputError):
-      await context.send(f"Sorry {context.author.mention}, but I could not understand the arguments passed to `?{context.command.qualified_name}`.")
+      await context.send(f"Sorry {context.author.mention}, but I could not understand the arguments passed to `{context.prefix}{context.command.qualified_name}`.")
     else:
       await context.send(f"Sorry {context.author.mention}, something unexpected happened while executing that command.")
       
@@ -66,7 +69,7 @@ class SecretChannelCog(commands.Cog, name="General Commands"):
         self.initialized[guild.id] = True
     
   def stop_auto_delete(self, guild):
-    if self.initialized[guild.id]:
+    if self.initialized.get(guild.id, False):
       self.initialized[guild.id] = False
       for channel_entry in self.secret_channels[guild.id]:
         channel_entry.cancel()
@@ -103,7 +106,7 @@ class SecretChannelCog(commands.Cog, name="General Commands"):
     admin_role = self.bot.get_admin_role(context.guild)
     roles = [x for x in [mod_role, admin_role] if x is not None]
     #if the author is not a mod or admin, or no member is specified, open the channel for the author
-    if (mod_role not in context.author.roles and admin_role not in context.author.roles and context.author.id not in self.bot.owner_ids):
+    if not is_mod_or_admin(self.bot, context.guild, context.author):
       member = None
     await self.create_secret_channel(context, reason, roles, member=member)
     try:
@@ -184,7 +187,7 @@ class SecretChannelCog(commands.Cog, name="General Commands"):
     msg = [
       f"Hey {user.mention}! Here is your private, temporary modmail channel. ",
       f"It's a good time to give additional information regarding your request. One of the {mods} will get back to you as soon as someone is available. ",
-      f"Type `?modmail close` to close the channel."
+      f"Type `{context.prefix}modmail close` to close the channel."
     ]
     if len(reason) > 0:
       msg.append(f"\n```{reason}```")
@@ -210,12 +213,8 @@ class SecretChannelCog(commands.Cog, name="General Commands"):
       await context.send("This channel cannot be affected this command.")
       return
     command_author = context.message.author
-    mod_role = self.bot.get_mod_role(context.guild)
-    admin_role = self.bot.get_admin_role(context.guild)
-    roles = [x for x in [mod_role, admin_role] if x is not None]
     # check permissions
-    if (mod_role in command_author.roles or admin_role in command_author.roles or
-      command_author.id in self.bot.owner_ids or command_author.id == secret_channel["user"]):
+    if is_mod_or_admin(self.bot, context.guild, command_author) or command_author.id == secret_channel["user"]:
       if (not secret_channel["alive"] and secret_channel.cancel()):
         secret_channel["alive"] = True
         await context.send("Channel expiry removed.")
@@ -240,12 +239,8 @@ class SecretChannelCog(commands.Cog, name="General Commands"):
       await context.send("This channel cannot be closed with this command.")
       return
     command_author = context.message.author
-    mod_role = self.bot.get_mod_role(context.guild)
-    admin_role = self.bot.get_admin_role(context.guild)
-    roles = [x for x in [mod_role, admin_role] if x is not None]
     # check permissions
-    if (mod_role in command_author.roles or admin_role in command_author.roles or
-      command_author.id in self.bot.owner_ids or command_author.id == secret_channel["user"]):
+    if is_mod_or_admin(self.bot, context.guild, command_author) or command_author.id == secret_channel["user"]:
       secret_channel.cancel()
       await self.delete_secret_channel(context.message.channel, self.bot.get_user(secret_channel["user"]), f"Deleted by {command_author.mention}")
     else:
@@ -4,10 +4,12 @@ import discord
 import re
 from pathlib import Path
 from discord.ext import commands, tasks
-from base.modules.access_checks import has_mod_role, has_admin_role, is_server_owner
+from base.modules.access_checks import has_mod_role, has_admin_role, is_server_owner, is_mod
 from base.modules.message_helper import wait_user_confirmation
+from base.modules.server_statistics import load_statistic_columns, server_statistics, format_percentiles
 
 class UserManagementCog(commands.Cog, name="User Management Commands"):
+  request_priority = "moderation" # the discord requests of these commands are scheduled first
   def __init__(self, bot):
     self.bot = bot
     self.update_slapcount.start()
@@ -24,7 +26,7 @@ class UserManagementCog(commands.Cog, name="User Management Commands"):
         await self.bot.on_task_error("Set random activity", error, guild)
     now = time.time()
     for guild in self.bot.guilds:
-      if self.bot.get_setting(guild, "AUTO_UPDATE") != "ON":
+      if not self.bot.is_initialized(guild) or self.bot.get_setting(guild, "AUTO_UPDATE") != "ON":
         continue
       try:
         db = self.bot.db[guild.id]
@@ -37,7 +39,7 @@ class UserManagementCog(commands.Cog, name="User Management Commands"):
               fields = {"User":f"{slap['username']}\n{slap['userid']}",
                         "Expiry":f"{time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(slap['expires']))} UTC"}
               await self.bot.log_mod(guild, title=title, fields=fields)
-          await self.bot.log_mod(guild, title="Updated warning counts")
+          await self.bot.log_maintenance(guild, title="Updated warning counts")
       except Exception as error:
         await self.bot.on_task_error("Update user warnings", error, guild)
       try:
@@ -56,14 +58,14 @@ class UserManagementCog(commands.Cog, name="User Management Commands"):
               fields = {"User":f"{member}\n{muted_user['userid']}",
                         "Expiry":f"{time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(muted_user['expires']))} UTC"}
               await self.bot.log_mod(guild, title=title, fields=fields)
-          await self.bot.log_mod(guild, title="Updated muted users")
+          await self.bot.log_maintenance(guild, title="Updated muted users")
       except Exception as error:
         await self.bot.on_task_error("Update muted users", error, guild)
       if self.update_slapcount.current_loop > 0:
         # update user stats only after reboot
         try:
           self.bot.update_user_stats(guild)
-          await self.bot.log_mod(guild, title="Updated user statistics")
+          await self.bot.log_maintenance(guild, title="Updated user statistics")
         except Exception as error:
           await self.bot.on_task_error("Update user statistics", error, guild)
 
@@ -72,19 +74,20 @@ class UserManagementCog(commands.Cog, name="User Management Commands"):
     await self.bot.wait_until_ready()
 
   async def cog_command_error(self, context, error):
-    if hasattr(context.command, "on_error"):
+    if hasattr(context.command, "on_error") or isinstance(error, commands.CommandOnCooldown):
       # This prevents any commands with local handlers being handled here.
+      # The rate limited invocations are answered by the bot's on_command_error.
       return
     if isinstance(error, commands.MissingPermissions):
       await context.send(f"Sorry {context.author.mention}, but you do not have permission to execute that command!")
     elif isinstance(error, commands.BotMissingPermissions):
       await context.send(f"Sorry {context.author.mention}, but I do not have permission to execute that command!")
     elif isinstance(error, commands.UserInputError):
-      await context.send(f"Sorry {context.author.mention}, but I could not understand the arguments passed to `?{context.command.qualified_name}`.")
+      await context.send(f"Sorry {context.author.mention}, but I could not understand the arguments passed to `{context.prefix}{context.command.qualified_name}`.")
     elif isinstance(error, commands.CheckFailure):
       await context.send(f"Sorry {context.author.mention}, but you do not have permission to execute that command!")
     elif isinstance(error, commands.MaxConcurrencyReached):
-      await context.send(f"Sorry {context.author.mention}, but only {error.number} user(s) can execute `?{context.command.qualified_name}` at the same time!")
+      await context.send(f"Sorry {context.author.mention}, but only {error.number} user(s) can execute `{context.prefix}{context.command.qualified_name}` at the same time!")
     else:
       await context.send(f"Sorry {context.author.mention}, something unexpected happened while executing that command.")
       
@@ -145,27 +148,30 @@ class UserManagementCog(commands.Cog, name="User Management Commands"):
     )
     max_warnings = self.get_max_warnings(member.guild)
     warn_duration = self.get_warn_duration(member.guild)
+    prefix = self.bot.get_guild_prefix(member.guild)
     await member.dm_channel.send(
       f"__**Warnings**__\n"
       f"When you receive a warning it will expire after {warn_duration} days. If you receive another warning during that time, "
       f"it will expire after {2*warn_duration} days from the time you got the last warning. "
       f"If you get no additional warnings during the expiry time, then all your warnings will be reset."
       f"If you receive more than {max_warnings} warnings without them expiring first, then you will be removed from the server. "
-      f"If you want to check the current status of your warnings, use the `?warn info` or `?slap info` command.\n\n"
-      f"If you have something to discuss with the mods, then use the `?modmail` command. You can specify the reason for opening the channel using `?modmail your reason`. "
-      f"To dispute any warnings, use the `?modmail` command."
+      f"If you want to check the current status of your warnings, use the `{prefix}warn info` or `{prefix}slap info` command.\n\n"
+      f"If you have something to discuss with the mods, then use the `{prefix}modmail` command. You can specify the reason for opening the channel using `{prefix}modmail your reason`. "
+      f"To dispute any warnings, use the `{prefix}modmail` command."
     )
 
-  @commands.command(
+  @commands.group(
     name="statistic",
     brief="Displays user activity stats",
     description="Will send a simple overview of tracked user stats on this discord server.",
     help="Note: Moderators are able to see other users' stats with the optional `member` parameter. `member` is usually a @mention, but can also be a users' id.",
     usage="[member]",
-    aliases=["statistics"]
+    aliases=["statistics"],
+    case_insensitive=True,
+    invoke_without_command=True
   )
   async def _statistic(self, context, member: discord.Member = None):
-    if context.author.id not in self.bot.owner_ids and self.bot.get_mod_role(context.guild) not in context.author.roles:
+    if not is_mod(self.bot, context.guild, context.author):
       user = context.author
     else:
       if member is None:
@@ -220,6 +226,38 @@ class UserManagementCog(commands.Cog, name="User Management Commands"):
       embed.set_footer(text="USER STATISTICS")
       await context.send(content=None, embed=embed)
 
+  @_statistic.command(
+    name="server",
+    brief="Displays server activity stats",
+    description="Will send an overview of the distribution of tracked user stats on this discord server.",
+    help="Percentiles are taken over all tracked users. The gini coefficient shows how concentrated the activity is: 0 means everyone is equally active, 1 means a single user sends everything.",
+    aliases=["guild"]
+  )
+  @has_mod_role()
+  async def _statistic_server(self, context):
+    columns = load_statistic_columns(self.bot.db[context.guild.id], self.bot.user_stats.get(context.guild.id))
+    stats = server_statistics(columns)
+    if stats is None:
+      await context.send("```None```")
+      return
+    embed = discord.Embed(
+      title=f"{context.guild.name} Statistics",
+      description=f"{stats['active_users']} active of {stats['users']} tracked user(s)",
+      colour=discord.Colour.green(),
+      timestamp=context.message.created_at
+    )
+    embed.add_field(name="Messages sent:", value=stats["messages"], inline=False)
+    embed.add_field(name="Messages per user:", value=format_percentiles(stats["percentiles"], stats["message_percentiles"]), inline=False)
+    embed.add_field(name="Words per user:", value=format_percentiles(stats["percentiles"], stats["word_percentiles"]), inline=False)
+    embed.add_field(name="Commands sent:", value=f"{stats['commands']} ({round(stats['command_ratio']*100, 2)}%)", inline=False)
+    embed.add_field(name="Word per message(average):", value=f"{round(stats['words_per_message'], 2)}", inline=False)
+    embed.add_field(name="Reactions to own messages:", value=f"{stats['reacts_to_own']} of {stats['reactions']} ({round(stats['reaction_self_ratio']*100, 2)}%)", inline=False)
+    embed.add_field(name="Activity concentration (gini):", 
+                    value=f"messages {round(stats['message_gini'], 3)}, words {round(stats['word_gini'], 3)}\n"
+                          f"top 1% of users sent {round(stats['top_1_percent_share']*100, 2)}% of messages", inline=False)
+    embed.set_footer(text="SERVER STATISTICS")
+    await context.send(content=None, embed=embed)
+
   @commands.command(
     name="mute",
     brief="Mutes one or more users",
@@ -411,7 +449,7 @@ class UserManagementCog(commands.Cog, name="User Management Commands"):
   )
   async def _warn_info(self, context, members: commands.Greedy[discord.Member]):
     #if not mod:
-    if context.author.id not in self.bot.owner_ids and self.bot.get_mod_role(context.guild) not in context.author.roles:
+    if not is_mod(self.bot, context.guild, context.author):
       warning = self.bot.db[context.guild.id].select("user_warnings", context.author.id)
       embed = discord.Embed(title=f"Warning Status", colour=discord.Colour.gold(), timestamp=context.message.created_at)
       embed.add_field(name="User:", value=f"{context.author.mention}", inline=False)
@@ -1,5 +1,82 @@
+import collections
+import time
 from discord.ext import commands
 
+class AuthorizationCache:
+  # a short-lived cache of the role based authorization of each member: guild id -> member id -> level -> bool
+  # the entries are dropped when the member's roles or the guild's roles/settings change, the ttl is a safety net
+  # the guilds and their members are kept in order of use, a full cache evicts the oldest member of the
+  # least recently used guild
+  def __init__(self, ttl=10.0, max_entries=4096):
+    self.ttl = ttl
+    self.max_entries = max_entries
+    self.entries = collections.OrderedDict() # guild id -> OrderedDict(member id -> (expiry, levels))
+    self.size = 0
+
+  def get(self, guild, member, level, compute):
+    now = time.monotonic()
+    members = self.entries.get(guild.id)
+    if members is None:
+      members = self.entries[guild.id] = collections.OrderedDict()
+    else:
+      self.entries.move_to_end(guild.id)
+    entry = members.get(member.id)
+    if entry is None or entry[0] < now:
+      if entry is None:
+        if self.size >= self.max_entries:
+          self.evict()
+        self.size += 1
+      entry = (now + self.ttl, {})
+      members[member.id] = entry
+    members.move_to_end(member.id)
+    levels = entry[1]
+    if level not in levels:
+      levels[level] = compute()
+    return levels[level]
+
+  def evict(self):
+    guild_id, members = next(iter(self.entries.items()))
+    if members:
+      members.popitem(last=False)
+      self.size -= 1
+    if not members:
+      del self.entries[guild_id]
+
+  def invalidate_member(self, guild, member):
+    members = self.entries.get(guild.id)
+    if members is not None and members.pop(member.id, None) is not None:
+      self.size -= 1
+
+  def invalidate_guild(self, guild):
+    members = self.entries.pop(guild.id, None)
+    if members is not None:
+      self.size -= len(members)
+
+def _has_any_role(member, *roles):
+  roles = [role for role in roles if role is not None]
+  return len(roles) > 0 and any(role in member.roles for role in roles)
+
+def is_admin(bot, guild, member):
+  if member.id in bot.owner_ids:
+    return True
+  return bot.auth_cache.get(guild, member, "admin",
+    lambda: _has_any_role(member, bot.get_admin_role(guild)))
+
+def is_mod(bot, guild, member):
+  if member.id in bot.owner_ids:
+    return True
+  return bot.auth_cache.get(guild, member, "mod",
+    lambda: _has_any_role(member, bot.get_mod_role(guild)))
+
+def is_mod_or_admin(bot, guild, member):
+  return is_mod(bot, guild, member) or is_admin(bot, guild, member)
+
+def is_cmd_editor(bot, guild, member):
+  if member.id in bot.owner_ids:
+    return True
+  return bot.auth_cache.get(guild, member, "cmd",
+    lambda: _has_any_role(member, bot.get_admin_role(guild), bot.get_cmd_role(guild)))
+
 def is_server_owner():
   async def predicate(context):
     return context.author.id == context.guild.owner.id
@@ -7,35 +84,15 @@ def is_server_owner():
 
 def has_admin_role():
   async def predicate(context):
-    if context.author.id in context.bot.owner_ids:
-      return True
-    admin_role = context.bot.get_admin_role(context.guild)
-    if admin_role is None:
-      return False
-    else:
-      return admin_role in context.author.roles
+    return is_admin(context.bot, context.guild, context.author)
   return commands.check(predicate)
-  
+
 def has_mod_role():
   async def predicate(context):
-    if context.author.id in context.bot.owner_ids:
-      return True
-    mod_role = context.bot.get_mod_role(context.guild)
-    if mod_role is None:
-      return False
-    else:
-      return mod_role in context.author.roles
+    return is_mod(context.bot, context.guild, context.author)
   return commands.check(predicate)
-  
+
 def can_edit_commands():
   async def predicate(context):
-    if context.author.id in context.bot.owner_ids:
-      return True
-    admin_role = context.bot.get_admin_role(context.guild)
-    cmd_role = context.bot.get_cmd_role(context.guild)
-    if admin_role is None and cmd_role is None:
-      return False
-    else:
-      return admin_role in context.author.roles or cmd_role in context.author.roles
+    return is_cmd_editor(context.bot, context.guild, context.author)
   return commands.check(predicate)
-
@@ -0,0 +1,68 @@
+HOURS_PER_WEEK = 168
+DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+SHADES = " ░▒▓█"
+
+# the unix epoch is a Thursday, shift by 3 days to make Monday 00:00 UTC the hour 0 of a week
+HEATMAP_QUERY = ("SELECT cid, MAX(channel), (CAST(time/3600 AS INTEGER) + 72) % 168 AS hour_of_week, COUNT(*), MAX(time) "
+                 "FROM messages WHERE time > ? GROUP BY cid, hour_of_week")
+
+class ActivityHeatmap:
+  # an hour-of-week x channel matrix of archived messages of one guild
+  # the matrix is cached and refreshed incrementally from the last processed message time
+  def __init__(self):
+    self.reset()
+
+  def reset(self):
+    # forget everything, the next refresh will rebuild the matrix from the whole table
+    self.counts = {} # channel id -> list of 168 message counts
+    self.names = {} # channel id -> channel name when the message was saved
+    self.last_time = -1
+
+  def refresh(self, db):
+    if self.last_time < 0:
+      db.create_index("messages", "time")
+    rows = db.query(HEATMAP_QUERY, (self.last_time,))
+    for cid, name, hour, count, max_time in rows:
+      if cid not in self.counts:
+        self.counts[cid] = [0]*HOURS_PER_WEEK
+      self.counts[cid][hour] += count
+      self.names[cid] = name
+      self.last_time = max(self.last_time, max_time)
+    return len(rows)
+
+  def combined(self, channel_ids=None):
+    # sum the rows of the given channels (all channels if None) into one hour-of-week row
+    total = [0]*HOURS_PER_WEEK
+    for cid, row in self.counts.items():
+      if channel_ids is None or cid in channel_ids:
+        for hour, count in enumerate(row):
+          total[hour] += count
+    return total
+
+  def ranking(self, channel_ids=None):
+    # (channel id, total messages, busiest hour of week) sorted by the total messages
+    result = []
+    for cid, row in self.counts.items():
+      if channel_ids is None or cid in channel_ids:
+        busiest = max(range(HOURS_PER_WEEK), key=row.__getitem__)
+        result.append((cid, sum(row), busiest))
+    result.sort(key=lambda x: x[1], reverse=True)
+    return result
+
+def hour_of_week_name(hour):
+  return f"{DAY_NAMES[hour // 24]} {hour % 24:02d}:00"
+
+def render_heatmap(row):
+  # render an hour-of-week row as a 7 days x 24 hours text grid
+  peak = max(row)
+  lines = ["     0     6     12    18    "]
+  for day, name in enumerate(DAY_NAMES):
+    cells = []
+    for count in row[day*24:(day+1)*24]:
+      if count == 0 or peak == 0:
+        cells.append(SHADES[0])
+      else:
+        cells.append(SHADES[1 + (count * (len(SHADES)-1) - 1) // peak])
+    lines.append(f"{name} |{''.join(cells)}|")
+  lines.append(f"UTC, {SHADES[-1]} = {peak} message(s)")
+  return "\n".join(lines)
@@ -37,7 +37,8 @@ class BotTimer(Timer):
     fields = {"Method":self._callback.__name__,
               "Task":self.task,
              f"{error.__class__.__name__}":f"{error}"}
-    await self.bot.log_error(self.guild, title=title, fields=fields)
+    await self.bot.log_error(self.guild, title=title, fields=fields,
+                             signature=("timer", self._callback.__name__, self.task, error.__class__.__name__, str(error)))
 
     
 def run_bot_coroutine(bot, guild, callback, *args, **kwargs):
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import tempfile
+import aiohttp
+import discord
+
+class AttachmentDownloader:
+  # downloads attachments in the background, at most `concurrency` at the same time
+  # the files are streamed to disk in chunks, never loaded into memory as a whole
+  # a file larger than max_file_size is skipped, as is a file which would exceed the bytes a guild may have
+  # queued or downloading at the same time (max_guild_pending), so one guild cannot fill the queue
+  # save and fetch return an asyncio task, the callers continue and await it when they need the file
+  def __init__(self, concurrency=4, max_file_size=25*1024*1024, max_guild_pending=100*1024*1024, timeout=120.0, chunk_size=64*1024):
+    self.concurrency = concurrency
+    self.max_file_size = max_file_size
+    self.max_guild_pending = max_guild_pending
+    self.timeout = timeout
+    self.chunk_size = chunk_size
+    self.semaphore = None
+    self.session = None
+    self.pending = {} # guild id -> bytes queued or downloading
+    self.downloaded = 0
+    self.skipped = 0
+    self.failed = 0
+
+  def admit(self, guild_id, attachment):
+    if attachment.size > self.max_file_size or self.pending.get(guild_id, 0) + attachment.size > self.max_guild_pending:
+      self.skipped += 1
+      return False
+    self.pending[guild_id] = self.pending.get(guild_id, 0) + attachment.size
+    return True
+
+  def done(self, guild_id, attachment):
+    self.pending[guild_id] -= attachment.size
+    if self.pending[guild_id] <= 0:
+      del self.pending[guild_id]
+
+  def get_semaphore(self):
+    if self.semaphore is None:
+      self.semaphore = asyncio.Semaphore(self.concurrency)
+    return self.semaphore
+
+  async def stream(self, attachment, fp, hasher=None):
+    if self.session is None or self.session.closed:
+      self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+    async with self.session.get(attachment.url) as response:
+      if response.status != 200:
+        raise discord.HTTPException(response, f"could not download {attachment.filename}")
+      size = 0
+      async for chunk in response.content.iter_chunked(self.chunk_size):
+        size += len(chunk)
+        if size > self.max_file_size: # the attachment size was wrong
+          raise ValueError(f"{attachment.filename} is larger than {self.max_file_size} bytes")
+        fp.write(chunk)
+        if hasher is not None:
+          hasher.update(chunk)
+
+  async def download_to_path(self, guild_id, attachment, filename, hasher=None):
+    # writes to a .part file first, so a file at filename is always complete
+    # the file is opened once the download may start, a queued download holds no file descriptor
+    part = f"{filename}.part"
+    try:
+      async with self.get_semaphore():
+        with open(part, "wb") as fp:
+          await self.stream(attachment, fp, hasher)
+        os.replace(part, filename)
+      self.downloaded += 1
+      return filename
+    except asyncio.CancelledError: # an Exception before python 3.8
+      raise
+    except Exception:
+      self.failed += 1
+      return None
+    finally: # also if the download was cancelled
+      if os.path.exists(part):
+        os.remove(part)
+      self.done(guild_id, attachment)
+
+  async def download_to_file(self, guild_id, attachment):
+    # a discord.File backed by a temporary file which is removed when it is closed
+    try:
+      async with self.get_semaphore():
+        fp = tempfile.TemporaryFile()
+        try:
+          await self.stream(attachment, getattr(fp, "file", fp))
+        except BaseException:
+          fp.close()
+          raise
+      fp.seek(0)
+      self.downloaded += 1
+      return discord.File(getattr(fp, "file", fp), filename=attachment.filename, spoiler=attachment.is_spoiler())
+    except asyncio.CancelledError: # an Exception before python 3.8
+      raise
+    except Exception:
+      self.failed += 1
+      return None
+    finally:
+      self.done(guild_id, attachment)
+
+  def save(self, guild_id, attachment, filename, hasher=None):
+    # returns a task with the filename as result or None if the file was skipped or could not be downloaded
+    # hasher (e.g. hashlib.sha256()) is updated with the content while it is downloaded
+    if not self.admit(guild_id, attachment):
+      return None
+    return asyncio.ensure_future(self.download_to_path(guild_id, attachment, filename, hasher))
+
+  def fetch(self, guild_id, attachment):
+    # returns a task with a discord.File as result or None if the file was skipped or could not be downloaded
+    if not self.admit(guild_id, attachment):
+      return None
+    return asyncio.ensure_future(self.download_to_file(guild_id, attachment))
+
+  async def close(self):
+    if self.session is not None:
+      await self.session.close()
+
+downloader = AttachmentDownloader()
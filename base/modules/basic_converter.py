@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 import pytz
 import re
 from emoji import UNICODE_EMOJI
+from base.modules.rate_limiter import RateLimit
 
 
 def FutureTimeConverter(argument):
@@ -100,10 +101,15 @@ def filter_attributes(attributes, string_attributes=None, bool_attributes=None,
   
 def cmd_add_converter(argument):
   attributes, cmd_text = parse_arguments(argument, '\n')
-  string_attributes = ["help", "brief", "usage", "description"]
+  string_attributes = ["help", "brief", "usage", "description", "rate", "per", "bucket"]
   bool_attributes = ["enabled", "hidden", "ignore_extra", "cooldown_after_parsing", "invoke_without_command", "case_insensitive"]
   list_attributes = ["aliases"]
-  return (filter_attributes(attributes, string_attributes, bool_attributes, list_attributes), cmd_text)
+  attributes = filter_attributes(attributes, string_attributes, bool_attributes, list_attributes)
+  try: # the rate limit attributes are checked here, they are only used by make_user_command
+    RateLimit(attributes.get("rate", 1), attributes.get("per", 1), attributes.get("bucket", "user"))
+  except ValueError as e:
+    raise commands.UserInputError(f"Unexpected rate limit: {e}")
+  return (attributes, cmd_text)
   
 def cmd_name_converter(argument):
   return " ".join(argument.split())
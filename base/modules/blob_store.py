@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import os
+import time
+from base.modules.constants import CACHE_PATH as path
+from base.modules.db_manager import Database
+from base.modules.attachment_downloader import downloader
+
+class BlobStore:
+  # content addressed storage of the cached and saved attachments: a file is stored once as
+  # {path}/blobs/<sha256[:2]>/<sha256> however often it is reposted, deleted, scheduled or saved
+  # the cache entries and message rows keep their file names ("{attachment id}_{filename}"),
+  # blob_files maps a name to its blob and counts the owners of the name (refs)
+  # names without a blob are the files of the previous versions in {path}/{name}, they are still resolved
+  def __init__(self, directory=f"{path}/blobs", identifier="blobs"):
+    self.directory = directory
+    self.identifier = identifier
+    self._db = None
+    self.downloads = {} # name -> task of a running download
+
+  @property
+  def db(self):
+    if self._db is None:
+      self._db = Database(self.identifier)
+      if "blobs" not in self._db:
+        self._db.create_table("blobs", "hash", hash="txt", size="int", created="real")
+      if "blob_files" not in self._db:
+        self._db.create_table("blob_files", "name", name="txt", hash="txt", refs="int")
+        self._db.create_index("blob_files", "hash")
+    return self._db
+
+  def blob_path(self, digest):
+    return f"{self.directory}/{digest[:2]}/{digest}"
+
+  def get_file(self, name):
+    # the names contain the user's file name, so they are passed as parameters and never formatted into the sql
+    rows = self.db.query("SELECT hash, refs FROM blob_files WHERE name=?", (name,))
+    return {"hash":rows[0][0], "refs":rows[0][1]} if rows else None
+
+  def delete_file(self, name):
+    self.db.query("DELETE FROM blob_files WHERE name=?", (name,))
+
+  def get_hash(self, name):
+    row = self.get_file(name)
+    return row["hash"] if row is not None else None
+
+  def path(self, name):
+    # the path of a file name, the legacy path if it has no blob (yet)
+    digest = self.get_hash(name)
+    return self.blob_path(digest) if digest else f"{path}/{name}"
+
+  def save_attachment(self, guild_id, attachment):
+    # adds an owner to the attachment's name and downloads it unless its blob already exists
+    # returns (name, task or None), name is None if the downloader skipped the attachment
+    name = f"{attachment.id}_{attachment.filename}"
+    row = self.get_file(name)
+    digest = row["hash"] if row is not None else None
+    refs = row["refs"]+1 if row is not None else 1
+    if digest or name in self.downloads:
+      self.db.insert_or_update("blob_files", name, digest, refs)
+      return name, self.downloads.get(name)
+    hasher = hashlib.sha256()
+    os.makedirs(self.directory, exist_ok=True)
+    download = downloader.save(guild_id, attachment, f"{self.directory}/{name}", hasher=hasher)
+    if download is None:
+      return None, None
+    self.db.insert_or_update("blob_files", name, digest, refs)
+    task = asyncio.ensure_future(self.add_download(name, download, hasher))
+    self.downloads[name] = task
+    return name, task
+
+  async def add_download(self, name, download, hasher):
+    try:
+      filename = await download
+      if filename is not None:
+        self.add_file(name, filename, hasher.hexdigest())
+      return filename
+    finally:
+      self.downloads.pop(name, None)
+
+  def add_file(self, name, filename, digest):
+    # moves a downloaded file into its blob, or drops it if the blob exists or the name has no owner anymore
+    row = self.get_file(name)
+    if row is None:
+      os.remove(filename)
+      return
+    blob = self.blob_path(digest)
+    if os.path.isfile(blob):
+      os.remove(filename)
+    else:
+      os.makedirs(os.path.dirname(blob), exist_ok=True)
+      os.replace(filename, blob)
+    self.db.insert_or_update("blobs", digest, os.path.getsize(blob), time.time())
+    self.db.insert_or_update("blob_files", name, digest, row["refs"])
+
+  def release(self, name):
+    # removes an owner of the name, the blob is deleted with its last reference
+    row = self.get_file(name)
+    if row is None: # a file of the previous versions
+      try:
+        os.remove(f"{path}/{name}")
+      except OSError:
+        pass
+      return
+    if row["refs"] > 1:
+      self.db.insert_or_update("blob_files", name, row["hash"], row["refs"]-1)
+      return
+    self.delete_file(name)
+    if row["hash"] and not self.db.query("SELECT 1 FROM blob_files WHERE hash=? LIMIT 1", (row["hash"],)):
+      self.delete_blob(row["hash"])
+
+  def delete_blob(self, digest):
+    try:
+      os.remove(self.blob_path(digest))
+    except OSError:
+      pass
+    self.db.delete_row("blobs", digest)
+
+  def gc(self):
+    # deletes the blobs without references and the files in the blob directory which are not known
+    # returns (deleted blobs, freed bytes)
+    unreferenced = self.db.query("SELECT hash, size FROM blobs WHERE hash NOT IN (SELECT hash FROM blob_files WHERE hash IS NOT NULL)")
+    deleted = len(unreferenced)
+    freed = sum(size for digest, size in unreferenced)
+    for digest, size in unreferenced:
+      self.delete_blob(digest)
+    known = {row[0] for row in self.db.query("SELECT hash FROM blobs")}
+    if os.path.isdir(self.directory):
+      for entry in os.scandir(self.directory):
+        if entry.is_dir():
+          for blob in os.scandir(entry.path):
+            if blob.name not in known:
+              deleted += 1
+              freed += blob.stat().st_size
+              os.remove(blob.path)
+        elif (entry.name[:-len(".part")] if entry.name.endswith(".part") else entry.name) not in self.downloads: # left over by an interrupted download
+          deleted += 1
+          freed += entry.stat().st_size
+          os.remove(entry.path)
+    return deleted, freed
+
+  def stats(self):
+    blobs, size = self.db.query("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs")[0]
+    names, refs = self.db.query("SELECT COUNT(*), COALESCE(SUM(refs), 0) FROM blob_files")[0]
+    return {"blobs":blobs, "bytes":size, "names":names, "references":refs}
+
+blob_store = BlobStore()
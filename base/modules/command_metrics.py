@@ -0,0 +1,136 @@
+import time
+import json
+import functools
+import contextvars
+
+# upper bounds of the latency histogram buckets in ms, the last bucket is everything above
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# the timing of the command which is executed in the current task, None outside of commands
+# tasks spawned by a command (log queue, temporary messages, downloads) inherit it, the timing is frozen
+# when the command finishes so they do not add their time to a recorded command
+_current_timing = contextvars.ContextVar("command_timing", default=None)
+
+class CommandTiming:
+  def __init__(self):
+    self.start = time.perf_counter()
+    self.db = 0.0
+    self.http = 0.0
+    self.finished = False
+
+def get_timing():
+  # the timing of the running command or None
+  timing = _current_timing.get()
+  return timing if timing is not None and not timing.finished else None
+
+def add_time(kind, seconds):
+  timing = get_timing()
+  if timing is not None:
+    setattr(timing, kind, getattr(timing, kind) + seconds)
+
+def timed_db(func):
+  # decorator for the (synchronous) db methods, adds the time to the running command
+  @functools.wraps(func)
+  def wrapper(*args, **kwargs):
+    if get_timing() is None:
+      return func(*args, **kwargs)
+    start = time.perf_counter()
+    try:
+      return func(*args, **kwargs)
+    finally:
+      add_time("db", time.perf_counter() - start)
+  return wrapper
+
+def install_http_timing(http):
+  # wrap the request method of discord's HTTPClient, each request adds the awaited time to the running command
+  if getattr(http.request, "timed", False):
+    return
+  request = http.request
+  async def timed_request(*args, **kwargs):
+    if get_timing() is None:
+      return await request(*args, **kwargs)
+    start = time.perf_counter()
+    try:
+      return await request(*args, **kwargs)
+    finally:
+      add_time("http", time.perf_counter() - start)
+  timed_request.timed = True
+  http.request = timed_request
+
+class CommandStats:
+  def __init__(self):
+    self.count = 0
+    self.errors = 0
+    self.total = 0.0
+    self.max = 0.0
+    self.db = 0.0
+    self.http = 0.0
+    self.histogram = [0]*(len(LATENCY_BUCKETS)+1)
+
+  def add(self, elapsed, db, http, failed):
+    self.count += 1
+    self.errors += int(failed)
+    self.total += elapsed
+    self.max = max(self.max, elapsed)
+    self.db += db
+    self.http += http
+    ms = elapsed*1000
+    for i, bound in enumerate(LATENCY_BUCKETS):
+      if ms <= bound:
+        self.histogram[i] += 1
+        break
+    else:
+      self.histogram[-1] += 1
+
+  def percentile(self, p):
+    # upper bound of the bucket containing the percentile p in ms (None if above the last bucket)
+    rank = p/100.0*self.count
+    seen = 0
+    for i, n in enumerate(self.histogram):
+      seen += n
+      if seen >= rank and n > 0:
+        return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else None
+    return None
+
+  def to_dict(self):
+    return {"count":self.count, "errors":self.errors, "total_s":round(self.total, 6), "max_s":round(self.max, 6),
+            "db_s":round(self.db, 6), "http_s":round(self.http, 6),
+            "histogram_ms":{str(b):n for b, n in zip(list(LATENCY_BUCKETS)+["inf"], self.histogram)}}
+
+class CommandMetrics:
+  # latency, outcome and db/discord time of each command, recorded by the before/after invoke hooks of the bot
+  def __init__(self):
+    self.commands = {} # qualified name -> CommandStats
+    self.since = time.time()
+
+  def start(self, context):
+    # a group and its subcommand call the hooks of the same context, only the first call starts the timing
+    if getattr(context, "timing", None) is None:
+      context.timing = CommandTiming()
+      context.timing_token = _current_timing.set(context.timing)
+
+  def finish(self, context):
+    timing = getattr(context, "timing", None)
+    if timing is None:
+      return
+    context.timing = None
+    timing.finished = True
+    try:
+      _current_timing.reset(context.timing_token)
+    except ValueError: # the hook ran in a different context
+      _current_timing.set(None)
+    elapsed = time.perf_counter() - timing.start
+    command = context.invoked_subcommand if context.invoked_subcommand is not None else context.command
+    name = command.qualified_name if command is not None else "unknown"
+    if name not in self.commands:
+      self.commands[name] = CommandStats()
+    self.commands[name].add(elapsed, timing.db, timing.http, context.command_failed)
+
+  def summary(self, sort_by="total"):
+    # rows of (name, stats) sorted descending
+    return sorted(self.commands.items(), key=lambda item: getattr(item[1], sort_by), reverse=True)
+
+  def dump(self, filename):
+    with open(filename, "w") as f:
+      json.dump({"since":self.since, "dumped":time.time(),
+                 "commands":{name:stats.to_dict() for name, stats in self.commands.items()}}, f, indent=1)
@@ -0,0 +1,124 @@
+import random
+import re
+import discord
+
+# {{ and }} are escaped braces, {name} or {name:option} is a placeholder
+TOKEN_REGEX = re.compile(r"\{\{|\}\}|\{([a-z]+)(\d*)(?::([^{}]*))?\}")
+
+class CommandTemplate:
+  # the text of a custom command compiled once into a list of parts
+  # a part is either a string or a function (context, args) -> string, so rendering is a single join
+  # supported placeholders: {author} {mention} {channel} {guild} {args} {argN} {count} {random:a|b|c}
+  # unknown placeholders are kept as they are
+  # counter(context) returns the saved number of earlier invocations for {count} or None,
+  # without it {count} counts the renders of this template, which start at 0 again when it is rebuilt
+  def __init__(self, text, counter=None):
+    self.text = text
+    self.count = 0
+    self.counter = counter
+    self.uses_args = False
+    self.parts = []
+    literal = []
+    index = 0
+    for match in TOKEN_REGEX.finditer(text):
+      literal.append(text[index:match.start()])
+      index = match.end()
+      token = match.group(0)
+      if token == "{{" or token == "}}":
+        literal.append(token[0])
+        continue
+      part = self.compile_placeholder(match.group(1), match.group(2), match.group(3))
+      if part is None:
+        literal.append(token)
+      else:
+        self.parts.append("".join(literal))
+        self.parts.append(part)
+        literal = []
+    literal.append(text[index:])
+    self.parts.append("".join(literal))
+    self.parts = [part for part in self.parts if part != ""]
+    self.is_static = all(isinstance(part, str) for part in self.parts)
+    if self.is_static:
+      self.static_text = "".join(self.parts)
+
+  def compile_placeholder(self, name, number, option):
+    if number:
+      if name != "arg" or option is not None:
+        return None
+      self.uses_args = True
+      i = int(number)
+      return lambda context, args: discord.utils.escape_mentions(args[i]) if i < len(args) else ""
+    if option is not None:
+      if name != "random":
+        return None
+      choices = option.split("|")
+      return lambda context, args: random.choice(choices)
+    if name == "author":
+      return lambda context, args: discord.utils.escape_mentions(context.author.display_name)
+    if name == "mention":
+      return lambda context, args: context.author.mention
+    if name == "channel":
+      return lambda context, args: context.channel.mention
+    if name == "guild":
+      return lambda context, args: discord.utils.escape_mentions(context.guild.name) if context.guild is not None else ""
+    if name == "args":
+      self.uses_args = True
+      return lambda context, args: discord.utils.escape_mentions(" ".join(args))
+    if name == "count":
+      return lambda context, args: str(self.get_count(context))
+    return None
+
+  def get_count(self, context):
+    count = self.counter(context) if self.counter is not None else None
+    return count + 1 if count is not None else self.count
+
+  def render(self, context, args=()):
+    self.count += 1
+    if self.is_static:
+      return self.static_text
+    return "".join([part if part.__class__ is str else part(context, args) for part in self.parts])
+
+if __name__ == "__main__":
+  # benchmark of rendering 10k invocations: python -m base.modules.command_template
+  import time
+  from types import SimpleNamespace
+
+  def render_naive(text, context, args):
+    # substitute the placeholders on every invocation
+    def replace(match):
+      name, number, option = match.group(1), match.group(2), match.group(3)
+      if match.group(0) in ("{{", "}}"):
+        return match.group(0)[0]
+      if name == "arg" and number:
+        return discord.utils.escape_mentions(args[int(number)]) if int(number) < len(args) else ""
+      if name == "random" and option is not None:
+        return random.choice(option.split("|"))
+      values = {"author":discord.utils.escape_mentions(context.author.display_name), "mention":context.author.mention,
+                "channel":context.channel.mention, "guild":discord.utils.escape_mentions(context.guild.name), "args":discord.utils.escape_mentions(" ".join(args)), "count":"1"}
+      return values.get(name, match.group(0))
+    return TOKEN_REGEX.sub(replace, text)
+
+  author = SimpleNamespace(display_name="Appa", mention="<@1234>")
+  context = SimpleNamespace(author=author, channel=SimpleNamespace(mention="<#5678>"), guild=SimpleNamespace(name="Guild"))
+  text = "Hey {mention}, welcome to {guild} in {channel}! You said: {args} ({arg0}). {random:yes|no|maybe} {{literal}} #{count}"
+  args = ("hello", "there", "friend")
+  n = 10000
+  start = time.perf_counter()
+  for i in range(n):
+    render_naive(text, context, args)
+  naive = time.perf_counter() - start
+  start = time.perf_counter()
+  template = CommandTemplate(text)
+  for i in range(n):
+    template.render(context, args)
+  compiled = time.perf_counter() - start
+  print(template.render(context, args))
+  print(f"parse per invocation: {naive*1000:.1f}ms for {n} renders")
+  print(f"compiled template:    {compiled*1000:.1f}ms for {n} renders (including compilation)")
+
+  # the names of the members and the guild must not ping
+  author = SimpleNamespace(display_name="@everyone", mention="<@1234>")
+  context = SimpleNamespace(author=author, channel=SimpleNamespace(mention="<#5678>"), guild=SimpleNamespace(name="@here"))
+  text = "{author} {guild}"
+  for rendered in (CommandTemplate(text).render(context), render_naive(text, context, ())):
+    assert "@everyone" not in rendered and "@here" not in rendered, rendered
@@ -0,0 +1,62 @@
+import time
+
+USAGE_UPSERT = ("INSERT INTO user_command_usage(cmdname, count, last_used) VALUES (?, ?, ?) "
+                "ON CONFLICT(cmdname) DO UPDATE SET count=count+excluded.count, last_used=max(last_used, excluded.last_used)")
+
+class CommandUsage:
+  # invocation counters of the custom commands, kept in memory and written to user_command_usage in batches
+  # so an invocation of a custom command does not write to the db
+  def __init__(self):
+    self.pending = {} # guild id -> command name -> [count, last used]
+    self.totals = {} # guild id -> command name -> count in user_command_usage, loaded on first use by count
+
+  def count(self, guild_id, cmdname, db):
+    # the number of invocations so far (saved and pending), e.g. for the {count} placeholder
+    totals = self.totals.setdefault(guild_id, {})
+    if cmdname not in totals:
+      rows = db.query("SELECT count FROM user_command_usage WHERE cmdname = ?", (cmdname,))
+      totals[cmdname] = rows[0][0] if rows else 0
+    usage = self.pending.get(guild_id, {}).get(cmdname)
+    return totals[cmdname] + (usage[0] if usage is not None else 0)
+
+  def record(self, guild_id, cmdname, now=None):
+    if now is None:
+      now = time.time()
+    usage = self.pending.setdefault(guild_id, {}).get(cmdname)
+    if usage is None:
+      self.pending[guild_id][cmdname] = [1, now]
+    else:
+      usage[0] += 1
+      usage[1] = now
+
+  def discard(self, guild_id, cmdname):
+    # forget the pending usage of a removed/renamed command and its subcommands
+    for usage in (self.pending.get(guild_id, {}), self.totals.get(guild_id, {})):
+      for name in [name for name in usage if name == cmdname or name.startswith(f"{cmdname} ")]:
+        del usage[name]
+
+  def flush(self, guild_id, db):
+    # write the pending usage of a guild with a single executemany, returns the number of written rows
+    pending = self.pending.pop(guild_id, None)
+    if not pending:
+      return 0
+    try:
+      db.query_many(USAGE_UPSERT, [(name, count, last_used) for name, (count, last_used) in pending.items()])
+    except Exception:
+      # keep the counts for the next flush
+      current = self.pending.setdefault(guild_id, {})
+      for name, (count, last_used) in pending.items():
+        usage = current.setdefault(name, [0, last_used])
+        usage[0] += count
+        usage[1] = max(usage[1], last_used)
+      raise
+    totals = self.totals.get(guild_id, {})
+    for name, (count, last_used) in pending.items():
+      if name in totals:
+        totals[name] += count
+    return len(pending)
+
+def load_usage(db):
+  # (command name, count, last used) of all custom commands, commands without usage have count 0 and last used None
+  return db.query("SELECT c.cmdname, IFNULL(u.count, 0), u.last_used FROM user_commands c "
+                  "LEFT JOIN user_command_usage u ON c.cmdname = u.cmdname ORDER BY IFNULL(u.count, 0), u.last_used, c.cmdname")
@@ -1,6 +1,8 @@
 import discord
 from discord.ext import commands
 from pytz import timezone
+from base.modules.command_template import CommandTemplate
+from base.modules.rate_limiter import RateLimit
 import operator
 import json
 
@@ -16,6 +18,124 @@ def json_load_dict(string):
     dic = {}
   return dic
 
+CMD_COLUMNS = ("cmdname", "message", "attributes", "isgroup", "lock")
+
+def select_cmd_rows(db, condition, params=()):
+  rows = db.query(f"SELECT {', '.join(CMD_COLUMNS)} FROM user_commands WHERE {condition}", params)
+  return [{k:v for k,v in zip(CMD_COLUMNS, row)} for row in rows]
+
+def find_root_cmd_rows(db, name, case_insensitive):
+  # the row of the top level command called name (or with the alias name) and the rows of its subcommands
+  rows = select_cmd_rows(db, "cmdname = ?", (name,)) # uses the primary key
+  if not rows and case_insensitive:
+    rows = select_cmd_rows(db, "cmdname = ? COLLATE NOCASE", (name,))
+  if not rows:
+    # the aliases are stored in the json attributes, LIKE only preselects the rows
+    key = name.lower() if case_insensitive else name
+    for row in select_cmd_rows(db, "instr(cmdname, ' ') = 0 AND attributes LIKE ?", (f"%{json.dumps(name)}%",)):
+      aliases = json_load_dict(row["attributes"]).get("aliases", [])
+      if isinstance(aliases, list) and key in [str(alias).lower() if case_insensitive else alias for alias in aliases]:
+        rows = [row]
+        break
+  if not rows:
+    return []
+  if rows[0]["isgroup"]:
+    prefix = f"{rows[0]['cmdname']} "
+    rows += select_cmd_rows(db, "substr(cmdname, 1, ?) = ?", (len(prefix), prefix))
+  return sorted(rows, key=lambda row: row["cmdname"])
+
+class CommandRoot:
+  # GroupMixin passes its options (case_insensitive) on to the next __init__, for a bot this is the Client
+  def __init__(self, **options):
+    pass
+
+class GuildCommands(commands.GroupMixin, CommandRoot):
+  # the custom commands of one guild, used as the root of the command tree instead of the bot
+  # get_command also finds the commands of the bot, so a custom command cannot shadow a built-in command
+  # the commands are loaded lazily from the user_commands table: a top level command is materialized together
+  # with its subcommands on the first lookup, names which are not in the table are remembered in self.unknown
+  def __init__(self, bot, db=None, max_unknown=1024):
+    super().__init__(case_insensitive=bot.case_insensitive)
+    self.bot = bot
+    self.db = db
+    self.max_unknown = max_unknown
+    self.unknown = set()
+    self.loading = False
+    self.loaded_all = db is None
+
+  def get_command(self, name):
+    command = self.get_custom_command(name)
+    if command is None:
+      command = self.bot.get_command(name)
+    return command
+
+  def get_custom_command(self, name):
+    # only the custom commands of the guild
+    command = super().get_command(name)
+    if command is None and name.strip() and not self.loaded_all and not self.loading:
+      root = name.split(maxsplit=1)[0]
+      if root not in self.all_commands and self.load_root(root):
+        command = super().get_command(name)
+    return command
+
+  def load_root(self, name):
+    # materialize the top level command name from the db, returns False if there is no such command
+    key = name.lower() if self.case_insensitive else name
+    if key in self.unknown:
+      return False
+    rows = find_root_cmd_rows(self.db, name, self.case_insensitive)
+    if not rows:
+      if len(self.unknown) >= self.max_unknown:
+        self.unknown.clear()
+      self.unknown.add(key)
+      return False
+    self.add_rows(rows)
+    return True
+
+  def load_all(self):
+    # materialize all the commands, e.g. to list them in the help
+    if self.loaded_all:
+      return
+    self.loaded_all = True
+    rows = self.db.select("user_commands")
+    if rows is not None:
+      rows.sort(key=lambda row: row["cmdname"])
+      self.add_rows([row for row in rows if commands.GroupMixin.get_command(self, row["cmdname"]) is None])
+    self.unknown.clear()
+
+  def add_rows(self, rows):
+    # no lazy loading while adding, the conflict checks only see the commands which are already materialized
+    self.loading = True
+    try:
+      for row in rows:
+        try:
+          add_cmd_from_row(self, row)
+        except Exception as e:
+          print(f"Error when adding command {row['cmdname']}: {e}")
+    finally:
+      self.loading = False
+
+class GuildHelpMixin:
+  # a mixin for help commands to list and resolve the custom commands of the current guild
+  def get_bot_mapping(self):
+    mapping = super().get_bot_mapping()
+    guild = self.context.guild
+    if guild is not None and guild.id in self.context.bot.custom_commands:
+      custom_commands = self.context.bot.custom_commands[guild.id]
+      custom_commands.load_all()
+      mapping[None] = list(mapping.get(None, [])) + list(custom_commands.commands)
+    return mapping
+
+  async def command_callback(self, context, *, command=None):
+    if command is not None and context.guild is not None and context.bot.get_command(command.split(' ')[0]) is None:
+      custom_command = context.bot.get_custom_command(context.guild, command)
+      if custom_command is not None:
+        await self.prepare_help_command(context, command)
+        if isinstance(custom_command, commands.Group):
+          return await self.send_group_help(custom_command)
+        return await self.send_command_help(custom_command)
+    return await super().command_callback(context, command=command)
+
 def get_cmd_parent_child(root, cmd_name):
   cmd_name_split = cmd_name.split(maxsplit=1)
   if len(cmd_name_split) == 1:
@@ -57,29 +177,54 @@ def get_cmd_attributes(bot, cmd_name, expected, check_child=False):
   return (parent, child_name, qualified_name)
     
      
+def pop_rate_limit(attributes):
+  # the rate limit attributes rate, per and bucket are not attributes of discord's Command
+  rate, per, bucket = attributes.pop("rate", None), attributes.pop("per", None), attributes.pop("bucket", "user")
+  if rate is None and per is None:
+    return None
+  return RateLimit(rate if rate is not None else 1, per if per is not None else 60, bucket)
+
+def get_usage_count(context):
+  # the invocations of the command before this one, as saved by the usage of the command management cog
+  # so {count} continues after a restart or an update of the command
+  cog = context.bot.get_cog("Command Management")
+  if cog is None or context.guild is None or context.guild.id not in context.bot.db:
+    return None
+  command = context.invoked_subcommand if context.invoked_subcommand is not None else context.command
+  return cog.usage.count(context.guild.id, command.qualified_name, context.bot.db[context.guild.id])
+
 def make_user_command(cmd_name, cmd_text, **attributes):
-  @commands.command(
-    name=cmd_name,
-    description="Usage"
-  )
-  async def _wrapper_user_cmd(context):
-    await context.send(cmd_text)
+  # the text is compiled once here, the command only renders it
+  rate_limit = pop_rate_limit(attributes)
+  template = CommandTemplate(cmd_text, get_usage_count)
+  if template.uses_args:
+    async def _user_cmd(context, *args):
+      await context.send(template.render(context, args))
+  else: # do not parse the arguments if the text does not use them
+    async def _user_cmd(context):
+      await context.send(template.render(context))
+  _wrapper_user_cmd = commands.command(name=cmd_name, description="Usage")(_user_cmd)
   _wrapper_user_cmd.update(**attributes)
+  _wrapper_user_cmd.template = template
+  _wrapper_user_cmd.rate_limit = rate_limit
   return _wrapper_user_cmd
     
 def make_user_group(cmd_name, cmd_text, **attributes):
-  @commands.group(
-    name=cmd_name,
-    invoke_without_command=True,
-    case_insensitive=True,
-    description="Usage"
-  )
-  async def _wrapper_user_cmd(context):
-    if cmd_text:
-      await context.send(cmd_text)
-    else:
-      await context.send_help(context.command)
+  rate_limit = pop_rate_limit(attributes)
+  template = CommandTemplate(cmd_text, get_usage_count) if cmd_text else None
+  if template is not None and template.uses_args:
+    async def _user_cmd(context, *args):
+      await context.send(template.render(context, args))
+  else:
+    async def _user_cmd(context):
+      if template is not None:
+        await context.send(template.render(context))
+      else:
+        await context.send_help(context.command)
+  _wrapper_user_cmd = commands.group(name=cmd_name, invoke_without_command=True, case_insensitive=True, description="Usage")(_user_cmd)
   _wrapper_user_cmd.update(**attributes)
+  _wrapper_user_cmd.template = template
+  _wrapper_user_cmd.rate_limit = rate_limit
   return _wrapper_user_cmd
   
 def fix_aliases(parent, child_name, aliases):
@@ -138,8 +283,8 @@ def set_new_cmd(parent, child_name, cmd_text, attributes, is_group=False, smart_
   move_subcommands(old_cmd, usr_command)
   return usr_command
   
-def add_cmd_from_row(bot, cmd):
+def add_cmd_from_row(root, cmd):
   attributes = json_load_dict(cmd["attributes"])
-  parent, child, cmd_name = get_cmd_attributes(bot, cmd["cmdname"], False)
+  parent, child, cmd_name = get_cmd_attributes(root, cmd["cmdname"], False)
   set_new_cmd(parent, child, cmd["message"], attributes, cmd["isgroup"], True)
   
@@ -1,7 +1,8 @@
 from discord.ext import commands
+from base.modules.custom_commands import GuildHelpMixin
 import operator
 
-class CategoryHelpCommand(commands.DefaultHelpCommand):
+class CategoryHelpCommand(GuildHelpMixin, commands.DefaultHelpCommand):
   # A customized help command class
   # One can input a dict: cog name -> category name
   # Then the help command will shows all the commands of the key cogs under the mapped categories
@@ -63,8 +64,9 @@ class CategoryHelpCommand(commands.DefaultHelpCommand):
       for command in commandMapping[category]:
         msg = await self.smart_append_msg(msg, f"{'':<{self.indent}}{command.name:<{max_len}} {command.short_doc}")
     msg = await self.smart_append_msg(msg, "") # empty line
-    msg = await self.smart_append_msg(msg, "Type ?help command for more info on a command.")
-    msg = await self.smart_append_msg(msg, "You can also type ?help category for more info on a category.")
+    prefix = await self.context.bot.find_prefix(self.context.message)
+    msg = await self.smart_append_msg(msg, f"Type {prefix}help command for more info on a command.")
+    msg = await self.smart_append_msg(msg, f"You can also type {prefix}help category for more info on a category.")
     await self.send_code_block(msg)
     
   async def smart_append_msg(self, msg, new_msg):
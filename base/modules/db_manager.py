@@ -4,6 +4,7 @@ except:
   import sqlite3
 import re
 from base.modules.constants import DB_PATH as path
+from base.modules.command_metrics import timed_db
 
 class DatabaseManager:
   allowed_chars = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_"
@@ -35,6 +36,7 @@ class DatabaseManager:
       if c not in self.allowed_chars:
         raise NameError(f"the name {_name} has forbidden characters; only a-zA-Z0-9 and _ are allowed.")
 
+  @timed_db
   def create_table(self, _name, _primary_keys, **kwargs):
     self.check_name(_name)
     for k in _primary_keys:
@@ -52,6 +54,7 @@ class DatabaseManager:
     except Exception:
       raise RuntimeError("the execution of `CREATE TABLE` failed.")
 
+  @timed_db
   def insert_or_update(self, _name, _primary_keys, **kwargs):
     self.check_name(_name)
     p_string = ",".join(["?" for i in range(len(kwargs))])
@@ -64,6 +67,7 @@ class DatabaseManager:
     except Exception:
       raise RuntimeError("the execution of `INSERT INTO` failed.")
 
+  @timed_db
   def delete_table(self, _name):
     self.check_name(_name)
     try:
@@ -72,6 +76,7 @@ class DatabaseManager:
     except Exception:
       raise RuntimeError("the execution of `DROP TABLE` failed.")
 
+  @timed_db
   def delete_row(self, _name, _primary_keys, _values):
     if len(_primary_keys) != len(_values):
       if len(_primary_keys) > len(_values):
@@ -88,6 +93,7 @@ class DatabaseManager:
     except Exception as e:
       raise RuntimeError("the execution of `SELECT ALL` failed.")
 
+  @timed_db
   def select_one(self, _name, _primary_keys, _values):
     if len(_primary_keys) != len(_values):
       if len(_primary_keys) > len(_values):
@@ -104,6 +110,7 @@ class DatabaseManager:
     except Exception:
       raise RuntimeError("the execution of `SELECT ONE` failed.")
 
+  @timed_db
   def select_all(self, _name):
     self.check_name(_name)
     try:
@@ -112,15 +119,37 @@ class DatabaseManager:
     except Exception as e:
       raise RuntimeError("the execution of `SELECT ALL` failed.")
 
-  def query(self, query):
+  @timed_db
+  def query(self, query, params=()):
     try:
       with self.connection as conn:
-        result = conn.execute(query)
+        result = conn.execute(query, params)
         if re.search("(SELECT|Select|select)", query):
           return result.fetchall()
     except Exception:
       raise RuntimeError("the execution of the query failed.")
 
+  @timed_db
+  def query_many(self, query, seq_params):
+    try:
+      with self.connection as conn:
+        conn.executemany(query, seq_params)
+    except Exception:
+      raise RuntimeError("the execution of the query failed.")
+
+  @timed_db
+  def create_index(self, _name, *_columns):
+    self.check_name(_name)
+    for k in _columns:
+      self.check_name(k)
+    index_name = f"{_name}_{'_'.join(_columns)}_idx"
+    try:
+      with self.connection as conn:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {_name} ({','.join(_columns)})")
+    except Exception:
+      raise RuntimeError("the execution of `CREATE INDEX` failed.")
+
+  @timed_db
   def info(self, _table=None):
     if _table is None:
       try:
@@ -0,0 +1,45 @@
+import time
+
+class ErrorSuppressor:
+  # the first error of a signature is logged, identical errors within `window` seconds are only counted
+  # after the window the count is logged once as a summary, so a failing task posts 2 embeds instead of hundreds
+  def __init__(self, window=600.0, max_entries=1000):
+    self.window = window
+    self.max_entries = max_entries
+    self.entries = {} # (guild id, signature) -> [end of window, suppressed count, title, fields]
+    self.summaries = [] # (guild id, title, fields, count) of finished windows
+    self.suppressed = 0
+
+  def hit(self, guild_id, signature, title, fields, now=None):
+    # returns True if the error should be logged now
+    if now is None:
+      now = time.monotonic()
+    key = (guild_id, signature)
+    entry = self.entries.get(key)
+    if entry is not None and entry[0] <= now:
+      self.finish(key)
+      entry = None
+    if entry is None:
+      if len(self.entries) >= self.max_entries:
+        self.expire(now)
+      self.entries[key] = [now + self.window, 0, title, fields]
+      return True
+    entry[1] += 1
+    entry[3] = fields # the summary shows the last occurrence
+    self.suppressed += 1
+    return False
+
+  def finish(self, key):
+    end, count, title, fields = self.entries.pop(key)
+    if count > 0:
+      self.summaries.append((key[0], title, fields, count))
+
+  def expire(self, now):
+    for key in [key for key, entry in self.entries.items() if entry[0] <= now]:
+      self.finish(key)
+
+  def pop_summaries(self, now=None):
+    # the summaries of all windows which ended before now
+    self.expire(time.monotonic() if now is None else now)
+    summaries, self.summaries = self.summaries, []
+    return summaries
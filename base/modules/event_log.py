@@ -0,0 +1,61 @@
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import time
+from datetime import datetime
+
+class CompressedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+  # rotates when the file reaches max_bytes or is older than max_age seconds, the rotated files are gzipped
+  # events.jsonl -> events.jsonl.1.gz -> events.jsonl.2.gz ... up to backup_count files
+  def __init__(self, filename, max_bytes=10*1024*1024, max_age=24*3600, backup_count=14):
+    super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+    self.max_age = max_age
+    self.namer = lambda name: name + ".gz"
+    self.rotator = self.compress
+    self.opened_at = os.path.getmtime(filename) if os.path.exists(filename) else time.time()
+
+  @staticmethod
+  def compress(source, dest):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+      shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+  def shouldRollover(self, record):
+    if self.max_age and time.time() - self.opened_at >= self.max_age and os.path.exists(self.baseFilename):
+      return True
+    return super().shouldRollover(record)
+
+  def doRollover(self):
+    super().doRollover()
+    self.opened_at = time.time()
+
+class EventLog:
+  # writes the log events (errors, moderation and administration actions) as json lines to a local file
+  # the events are put in a queue and written by a background thread, so logging never blocks the event loop
+  def __init__(self, directory, filename="events.jsonl", **kwargs):
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+    self.handler = CompressedRotatingFileHandler(os.path.join(directory, filename), **kwargs)
+    self.handler.setFormatter(logging.Formatter("%(message)s"))
+    self.queue = queue.SimpleQueue()
+    self.logger = logging.getLogger(f"base.events.{id(self)}")
+    self.logger.propagate = False
+    self.logger.setLevel(logging.INFO)
+    self.logger.addHandler(logging.handlers.QueueHandler(self.queue))
+    self.listener = logging.handlers.QueueListener(self.queue, self.handler)
+    self.listener.start()
+
+  def write(self, kind, guild, title, description=None, fields=None, timestamp=None):
+    event = {"time":(timestamp or datetime.utcnow()).isoformat(), "kind":kind,
+             "guild":guild.id if guild is not None else None, "guild_name":guild.name if guild is not None else None,
+             "title":title, "description":description, "fields":fields or {}}
+    self.logger.info(json.dumps(event, ensure_ascii=False, default=str))
+
+  def close(self):
+    # writes the queued events and closes the file
+    self.listener.stop()
+    self.handler.close()
@@ -5,6 +5,7 @@ import discord
 from discord.ext import commands
 from base.modules.interactive_message import InteractiveMessage
 from base.modules.constants import arrow_emojis, num_emojis
+from base.modules.custom_commands import GuildHelpMixin
 
 def get_cmd_help_string_short(command, help_cmd=None):
   cmd_str = [f"`{command.name}"]
@@ -55,7 +56,7 @@ async def get_cmd_help_string(command, prefix, page=None, display_all_subcommand
         and math.ceil(float(len_orig_subs)/len_num) -1 != page):
       #if no last page
       cmd_str.append(f"To see more subcommands use {arrow_emojis['forward']}.\n")
-    cmd_str.append(f"For more information use `?help {command.qualified_name} <command>`.")
+    cmd_str.append(f"For more information use `{prefix}help {command.qualified_name} <command>`.")
   else:
     signature = command.signature
     if signature:
@@ -66,7 +67,7 @@ async def get_cmd_help_string(command, prefix, page=None, display_all_subcommand
     cmd_str.append(f"\n\n{command.help}")
   return "".join(cmd_str)
 
-class InteractiveHelpCommand(commands.HelpCommand):
+class InteractiveHelpCommand(GuildHelpMixin, commands.HelpCommand):
 
   def __init__(self, category_mappings, custom_category="Server Specific", no_category="No Category", show_aliases=False, sort_commands=True, *args, **options):
     super().__init__(**options)
@@ -0,0 +1,92 @@
+import asyncio
+import time
+import traceback
+
+MAX_EMBEDS = 10 # embeds per message
+MAX_EMBED_CHARS = 6000 # characters of all embeds of a message
+
+def batch_embeds(embeds, max_embeds=MAX_EMBEDS, max_chars=MAX_EMBED_CHARS):
+  # splits the embeds into consecutive batches which fit into one message
+  batch = []
+  chars = 0
+  for embed in embeds:
+    size = len(embed)
+    if batch and (len(batch) >= max_embeds or chars + size > max_chars):
+      yield batch
+      batch = []
+      chars = 0
+    batch.append(embed)
+    chars += size
+  if batch:
+    yield batch
+
+class LogQueue:
+  # the log embeds of one guild, put returns immediately and a background task sends them
+  # the task waits up to `interval` seconds for more embeds (or until max_batch are queued) and
+  # sends consecutive embeds of the same log channel as one message, keeping their order
+  # if max_pending embeds are queued, put waits until there is space again (backpressure)
+  def __init__(self, send, interval=2.0, max_batch=MAX_EMBEDS, max_pending=500):
+    self.send = send # coroutine (log name, [embeds]) sending one message
+    self.interval = interval
+    self.max_batch = max_batch
+    self.queue = asyncio.Queue(maxsize=max_pending)
+    self.task = None
+    self.sent = 0
+    self.messages = 0
+    self.failed = 0
+    self.waited = 0 # puts which had to wait for space
+
+  async def put(self, name, embed):
+    if self.task is None or self.task.done():
+      self.task = asyncio.ensure_future(self.run())
+    if self.queue.full():
+      self.waited += 1
+    await self.queue.put((name, embed))
+
+  async def run(self):
+    while True:
+      items = [await self.queue.get()]
+      deadline = time.monotonic() + self.interval
+      while len(items) < self.max_batch:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+          break
+        try:
+          items.append(await asyncio.wait_for(self.queue.get(), timeout))
+        except asyncio.TimeoutError:
+          break
+      await self.send_items(items)
+
+  async def send_items(self, items):
+    # groups consecutive embeds of the same log, a flush never reorders embeds
+    groups = []
+    for name, embed in items:
+      if groups and groups[-1][0] == name:
+        groups[-1][1].append(embed)
+      else:
+        groups.append((name, [embed]))
+    for name, embeds in groups:
+      for batch in batch_embeds(embeds, self.max_batch):
+        try:
+          await self.send(name, batch)
+          self.sent += len(batch)
+          self.messages += 1
+        except Exception:
+          self.failed += len(batch)
+          traceback.print_exc()
+    for item in items:
+      self.queue.task_done()
+
+  async def flush(self, timeout=10.0):
+    # waits until the queued embeds are sent (at most timeout seconds) and stops the background task
+    if self.task is None:
+      return
+    try:
+      await asyncio.wait_for(self.queue.join(), timeout)
+    except asyncio.TimeoutError:
+      print(f"Dropped {self.queue.qsize()} log embed(s) which could not be sent in time")
+    self.task.cancel()
+    self.task = None
+
+  def stats(self):
+    return {"queued":self.queue.qsize(), "sent":self.sent, "messages":self.messages, "failed":self.failed, "waited":self.waited}
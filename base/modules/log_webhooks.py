@@ -0,0 +1,52 @@
+import time
+import discord
+
+WEBHOOK_NAME = "Bot Log"
+
+class LogWebhooks:
+  # one webhook per log channel, created by the bot and cached by channel id
+  # webhook messages have their own rate limits, so logging does not slow down the bot's replies
+  # a channel where no webhook can be used (e.g. missing manage_webhooks) is retried after retry_after seconds
+  def __init__(self, retry_after=600.0):
+    self.retry_after = retry_after
+    self.webhooks = {} # channel id -> Webhook
+    self.unavailable = {} # channel id -> time of the next try
+
+  async def get(self, channel):
+    webhook = self.webhooks.get(channel.id)
+    if webhook is not None:
+      return webhook
+    if self.unavailable.get(channel.id, 0) > time.monotonic():
+      return None
+    try:
+      webhook = discord.utils.find(lambda hook: hook.name == WEBHOOK_NAME and hook.token is not None
+                                   and hook.user is not None and hook.user.id == channel.guild.me.id, await channel.webhooks())
+      if webhook is None:
+        webhook = await channel.create_webhook(name=WEBHOOK_NAME, reason="Webhook for the bot's logs.")
+    except discord.HTTPException:
+      self.unavailable[channel.id] = time.monotonic() + self.retry_after
+      return None
+    self.webhooks[channel.id] = webhook
+    return webhook
+
+  async def send(self, channel, embeds, **kwargs):
+    # returns False if the embeds were not sent and the caller should fall back to the channel
+    webhook = await self.get(channel)
+    if webhook is None:
+      return False
+    try:
+      await webhook.send(embeds=embeds, **kwargs)
+    except discord.NotFound: # deleted webhook, create a new one the next time
+      self.invalidate(channel.id)
+      return False
+    except discord.HTTPException as e:
+      if e.status == 400: # not a webhook problem, the caller sends the embeds one by one
+        return False
+      self.invalidate(channel.id)
+      self.unavailable[channel.id] = time.monotonic() + self.retry_after
+      return False
+    return True
+
+  def invalidate(self, channel_id):
+    self.webhooks.pop(channel_id, None)
+    self.unavailable.pop(channel_id, None)
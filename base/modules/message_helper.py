@@ -5,7 +5,10 @@ import asyncio
 import json
 import os
 import discord
-from base.modules.constants import num_emojis, CACHE_PATH as path
+from base.modules.constants import num_emojis
+from base.modules.temp_messages import temp_messages
+from base.modules.attachment_downloader import downloader
+from base.modules.blob_store import blob_store
 
 def json_load_list(string):
   if string:
@@ -26,21 +29,24 @@ async def get_message_attachments(message):
     if len(embed) > 0:
       embedOrigin = embed
       break
-  # get all files attached
-  files = []
-  for attachment in message.attachments:
-    files.append(await attachment.to_file())
-  return (embedOrigin, files)
+  # get all files attached, downloaded at the same time and streamed to temporary files
+  # missing are the file names of the attachments which were skipped (too large) or could not be downloaded
+  guild_id = message.guild.id if message.guild is not None else 0
+  downloads = [downloader.fetch(guild_id, attachment) for attachment in message.attachments]
+  files = await asyncio.gather(*[download for download in downloads if download is not None])
+  files = iter(files)
+  results = [next(files) if download is not None else None for download in downloads]
+  missing = [attachment.filename for attachment, file in zip(message.attachments, results) if file is None]
+  return (embedOrigin, [file for file in results if file is not None], missing)
   
 async def message_to_row(message):
   embeds = json.dumps([embed.to_dict() for embed in message.embeds])
   filenames = []
   for attachment in message.attachments:
-    try:
-      await attachment.save(f"{path}/{attachment.id}_{attachment.filename}")
-      filenames.append(f"{attachment.id}_{attachment.filename}")
-    except:
-      pass
+    # downloaded in the background into the blob store, the row is saved right away
+    file_name, download = blob_store.save_attachment(message.guild.id, attachment)
+    if file_name is not None:
+      filenames.append(file_name)
   files = json.dumps(filenames)
   return (message.id, pytz.utc.localize(message.created_at).timestamp(), message.author.id, str(message.author),
     message.channel.id, message.channel.name, message.content, embeds, files)
@@ -89,8 +95,9 @@ def get_full_message(row, bot, guild):
       pass
   files_post = []
   for file_name in files:
-    if os.path.isfile(f"{path}/{file_name}"):
-      files_post.append(discord.File(f"{path}/{file_name}", filename=file_name.split("_", 1)[-1]))
+    file_path = blob_store.path(file_name)
+    if os.path.isfile(file_path):
+      files_post.append(discord.File(file_path, filename=file_name.split("_", 1)[-1]))
   return text, embed_post, files_post
   
 def clean_message_files(row):
@@ -101,21 +108,17 @@ def clean_message_files(row):
   files = json_load_list(files)
   for file_name in files:
     try:
-      os.remove(f"{path}/{file_name}")
+      blob_store.release(file_name)
     except:
       pass
       
 async def send_temp_message(messageable, content, timeout=10.0):
-  # send a temporary message which will disappear after timeout
-  msg = await messageable.send(f"{content}\nThis message will disappear in {round(timeout)}s.")
-  start_time = time.perf_counter()
-  while True:
-    await asyncio.sleep(1)
-    lefttime = timeout - (time.perf_counter() - start_time)
-    if lefttime < 0:
-      break
-    await msg.edit(content=f"{content}\nThis message will disappear in {round(lefttime)}s.")
-  await msg.delete()
+  # send a temporary message which will disappear after timeout, returns once the message is sent
+  # discord shows the countdown of the relative timestamp, so the message is never edited
+  expires = round(time.time() + timeout)
+  msg = await messageable.send(f"{content}\nThis message will disappear <t:{expires}:R>.")
+  temp_messages.add(msg, timeout)
+  return msg
   
 async def wait_user_confirmation(context, content, timeout=30.0):
   # Send a message to ask for a user confirmation, return True if the user replies yes, False if timeout or user replies no
@@ -156,6 +159,10 @@ async def multiple_choice(context, content, timeout=30.0, *, num:int=None, emoji
   
 async def save_message(bot, message):
   # ensure the synchronization of this method
+  db = bot.db[message.channel.guild.id]
+  old_row = db.select("messages", message.id)
   row = await message_to_row(message)
-  bot.db[message.channel.guild.id].insert_or_update("messages", *row)
+  if old_row is not None: # saved again, the old row's references to the files are replaced
+    clean_message_files(old_row)
+  db.insert_or_update("messages", *row)
   
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import os
+import time
+import discord
+from base.modules.constants import CACHE_PATH as path
+from base.modules.permission_sync import overwrite_differs
+from base.modules.request_scheduler import set_request_priority
+
+class PermissionJob:
+  # sets the overwrite of one target (role) in many channels of a guild
+  # the pending channel ids are saved, so an interrupted job continues after a restart
+  def __init__(self, guild_id, target_id, allow, deny, pending, done=0, skipped=0, failed=None, started=None):
+    self.guild_id = guild_id
+    self.target_id = target_id
+    self.allow = allow
+    self.deny = deny
+    self.pending = list(pending)
+    self.done = done
+    self.skipped = skipped
+    self.failed = failed if failed is not None else {} # channel id -> error
+    self.started = started if started is not None else time.time()
+    self.task = None
+
+  @property
+  def total(self):
+    return len(self.pending) + self.done + self.skipped + len(self.failed)
+
+  @property
+  def overwrite(self):
+    return discord.PermissionOverwrite.from_pair(discord.Permissions(self.allow), discord.Permissions(self.deny))
+
+  def is_running(self):
+    return self.task is not None and not self.task.done()
+
+  def progress(self):
+    return (f"{self.done + self.skipped + len(self.failed)}/{self.total} channels: {self.done} updated, "
+            f"{self.skipped} skipped (up to date or deleted), {len(self.failed)} failed")
+
+  def to_dict(self):
+    return {"guild":self.guild_id, "target":self.target_id, "allow":self.allow, "deny":self.deny, "pending":self.pending,
+            "done":self.done, "skipped":self.skipped, "failed":{str(k):v for k, v in self.failed.items()}, "started":self.started}
+
+  @classmethod
+  def from_dict(cls, dic):
+    return cls(dic["guild"], dic["target"], dic["allow"], dic["deny"], dic["pending"], dic["done"], dic["skipped"],
+               {int(k):v for k, v in dic["failed"].items()}, dic["started"])
+
+class PermissionPropagator:
+  # runs the permission jobs of all guilds, each job uses at most `concurrency` requests at the same time
+  # discord.py's http client waits for the (per route) rate limits, the bound keeps a job from using all of them
+  # the jobs are saved every `save_every` channels and when they finish
+  def __init__(self, bot, concurrency=3, save_every=25, filename=f"{path}/permission_jobs.json"):
+    self.bot = bot
+    self.concurrency = concurrency
+    self.save_every = save_every
+    self.filename = filename
+    self.jobs = {} # (guild id, target id) -> PermissionJob
+    self.load()
+
+  def load(self):
+    try:
+      with open(self.filename) as f:
+        for dic in json.load(f):
+          job = PermissionJob.from_dict(dic)
+          self.jobs[(job.guild_id, job.target_id)] = job
+    except FileNotFoundError:
+      pass
+    except Exception as e:
+      print(f"Could not load the permission jobs: {e}")
+
+  def save(self):
+    if not os.path.isdir(path):
+      os.mkdir(path)
+    unfinished = [job.to_dict() for job in self.jobs.values() if job.pending]
+    with open(self.filename, "w") as f:
+      json.dump(unfinished, f)
+
+  def get(self, guild, target):
+    return self.jobs.get((guild.id, target.id))
+
+  def start(self, guild, target, overwrite, channels=None):
+    # starts (or returns the running) job which sets the overwrite of target in channels (default: all channels)
+    job = self.get(guild, target)
+    if job is not None and job.is_running():
+      return job
+    allow, deny = overwrite.pair()
+    channels = guild.channels if channels is None else channels
+    job = PermissionJob(guild.id, target.id, allow.value, deny.value, [channel.id for channel in channels])
+    self.jobs[(guild.id, target.id)] = job
+    self.save()
+    job.task = asyncio.create_task(self.run(job))
+    return job
+
+  def resume(self, guild):
+    # continues the saved jobs of an initialized guild
+    for job in [job for job in self.jobs.values() if job.guild_id == guild.id and not job.is_running()]:
+      if guild.get_role(job.target_id) is None: # the role was deleted in the meantime
+        del self.jobs[(job.guild_id, job.target_id)]
+        self.save()
+      elif job.pending:
+        job.task = asyncio.create_task(self.run(job))
+
+  async def run(self, job):
+    guild = self.bot.get_guild(job.guild_id)
+    target = guild.get_role(job.target_id) if guild is not None else None
+    if target is None:
+      return job
+    overwrite = job.overwrite
+    set_request_priority("cosmetic") # a background task, the bulk requests come after all others
+    semaphore = asyncio.Semaphore(self.concurrency)
+    processed = 0
+    async def worker(channel_id):
+      nonlocal processed
+      async with semaphore:
+        channel = guild.get_channel(channel_id)
+        try:
+          if channel is None: # deleted in the meantime
+            job.skipped += 1
+          elif not overwrite_differs(channel, target, overwrite):
+            job.skipped += 1
+          else:
+            await channel.set_permissions(target, overwrite=overwrite, reason="Permission sync")
+            job.done += 1
+        except Exception as e:
+          job.failed[channel_id] = str(e)
+        job.pending.remove(channel_id)
+        processed += 1
+        if processed % self.save_every == 0:
+          self.save()
+    try:
+      await asyncio.gather(*[worker(channel_id) for channel_id in list(job.pending)])
+    finally:
+      self.save()
+    if job.failed:
+      try:
+        await self.bot.log_error(guild, title="Permission sync incomplete",
+                                 description=f"Could not set the overwrite of {target.mention} in {len(job.failed)} channel(s).",
+                                 fields={"Progress":job.progress()})
+      except:
+        pass
+    return job
@@ -0,0 +1,21 @@
+def overwrite_pairs(overwrites):
+  # {target id: (allow, deny)} of a {target: PermissionOverwrite} mapping
+  pairs = {}
+  for target, overwrite in overwrites.items():
+    if target is None:
+      continue
+    allow, deny = overwrite.pair()
+    pairs[target.id] = (allow.value, deny.value)
+  return pairs
+
+def channel_overwrite_pairs(channel):
+  # the cached overwrites of a channel in the same form, uses the raw overwrites so uncached members are kept
+  return {overwrite.id: (overwrite.allow, overwrite.deny) for overwrite in channel._overwrites}
+
+def overwrites_differ(channel, overwrites):
+  # True if editing the channel to exactly these overwrites would change anything
+  return channel_overwrite_pairs(channel) != overwrite_pairs(overwrites)
+
+def overwrite_differs(channel, target, overwrite):
+  # True if setting the overwrite of a single target would change anything
+  return channel_overwrite_pairs(channel).get(target.id, (0, 0)) != overwrite_pairs({target: overwrite})[target.id]
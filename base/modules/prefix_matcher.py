@@ -0,0 +1,117 @@
+class PrefixMatcher:
+  # matches the command prefix(es) at the start of a message and counts how often the prefix is repeated
+  # e.g. with the prefix "?", "?help" is a command (count 1) while "???" is not (count 3)
+  def __init__(self, prefixes):
+    if isinstance(prefixes, str):
+      prefixes = (prefixes,)
+    self.default = prefixes[0] if prefixes else None # the prefix to display in help texts
+    # the longest prefix wins if several prefixes match
+    self.prefixes = tuple(sorted(set(prefixes), key=len, reverse=True))
+
+  def match(self, content):
+    # returns (prefix, count) or (None, 0) if the content does not start with any prefix
+    for prefix in self.prefixes:
+      if content.startswith(prefix):
+        size = len(prefix)
+        if size == 0:
+          return prefix, 1
+        count = 1
+        index = size
+        while content.startswith(prefix, index):
+          count += 1
+          index += size
+        return prefix, count
+    return None, 0
+
+_matchers = {}
+_setting_matchers = {}
+
+def _cached_matcher(cache, key, prefixes, max_size):
+  matcher = cache.get(key)
+  if matcher is None:
+    if len(cache) >= max_size:
+      cache.clear()
+    matcher = cache[key] = PrefixMatcher(prefixes())
+  return matcher
+
+def get_prefix_matcher(prefixes, max_size=256):
+  # the matchers are cached per prefix set, so no matcher is built while handling a message
+  key = prefixes if isinstance(prefixes, str) else tuple(prefixes)
+  return _cached_matcher(_matchers, key, lambda: key, max_size)
+
+def normalize_prefix_setting(value):
+  # the PREFIX setting is a space separated list of prefixes, e.g. "? !"
+  return " ".join(str(value).split())
+
+def get_setting_matcher(value, max_size=256):
+  # the matcher of a PREFIX setting value, cached by the value so the setting is split only once
+  return _cached_matcher(_setting_matchers, value, lambda: tuple(value.split()), max_size)
+
+def count_message(matcher, content):
+  # (prefix count, commands, words) of a message as tracked in the user statistics
+  prefix, prefix_count = matcher.match(content)
+  if prefix_count == 1: # bot commands should not increase words
+    return prefix_count, 1, 0
+  # multiple prefixes are not counted as a command
+  # the words are only counted for messages which are not commands; str.split is a single scan in C and
+  # measured faster than counting the words in python or with a regex, even though it builds the list
+  return prefix_count, 0, len(content.split())
+
+if __name__ == "__main__":
+  # benchmark of the prefix and word counting in BaseBot.on_message: python -m base.modules.prefix_matcher
+  import asyncio
+  import random
+  import re
+  import time
+
+  async def get_prefix(message):
+    return "?"
+
+  async def old_on_message(content):
+    # the previous implementation, compiling a regex for every message
+    prefix = await get_prefix(content)
+    prefix_match = re.match(f"({re.escape(prefix)}+)", content)
+    if prefix_match is not None:
+      prefix_count = len(prefix_match.group(0))/len(prefix)
+      if prefix_count == 1:
+        return prefix_count, 1, 0
+      return prefix_count, 0, len(content.split())
+    return 0, 0, len(content.split())
+
+  async def new_on_message(content):
+    return count_message(get_prefix_matcher(await get_prefix(content)), content)
+
+  def count_words_scan(content):
+    # counting the words without splitting, for comparison with str.split
+    count = 0
+    space = True
+    for char in content:
+      if space and not char.isspace():
+        count += 1
+      space = char.isspace()
+    return count
+
+  async def run(handler, messages):
+    start = time.perf_counter()
+    for content in messages:
+      await handler(content)
+    return len(messages) / (time.perf_counter() - start)
+
+  rng = random.Random(0)
+  words = ["hello", "there", "what", "is", "up", "with", "the", "bot", "today", "lol"]
+  messages = []
+  for i in range(200000):
+    text = " ".join(rng.choice(words) for j in range(rng.randint(1, 30)))
+    messages.append(rng.choice(["", "", "", "?", "???"]) + text)
+  loop = asyncio.get_event_loop()
+  for content in messages[:1000]:
+    assert loop.run_until_complete(old_on_message(content)) == loop.run_until_complete(new_on_message(content))
+  old_rate = loop.run_until_complete(run(old_on_message, messages))
+  new_rate = loop.run_until_complete(run(new_on_message, messages))
+  print(f"regex per message: {old_rate:,.0f} messages/s")
+  print(f"prefix matcher:    {new_rate:,.0f} messages/s")
+  for name, count_words in (("str.split", lambda content: len(content.split())), ("character scan", count_words_scan)):
+    start = time.perf_counter()
+    for content in messages:
+      count_words(content)
+    print(f"{name} word count: {len(messages) / (time.perf_counter() - start):,.0f} messages/s")
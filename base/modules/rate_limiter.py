@@ -0,0 +1,95 @@
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+BUCKETS = ("user", "channel", "guild")
+
+class RateLimit:
+  # allows rate invocations per `per` seconds, tokens refill continuously
+  # bucket decides who shares the tokens: each user, each channel or the whole guild
+  def __init__(self, rate, per, bucket="user"):
+    self.rate = int(rate)
+    self.per = float(per)
+    self.bucket = str(bucket).lower()
+    if self.rate <= 0 or self.per <= 0:
+      raise ValueError("rate and per must be positive.")
+    if self.bucket not in BUCKETS:
+      raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}.")
+
+  def __str__(self):
+    return f"{self.rate}/{self.per:g}/{self.bucket}"
+
+  @classmethod
+  def from_string(cls, value):
+    # "rate/per" or "rate/per/bucket", e.g. "2/10/channel"
+    parts = value.strip().split("/")
+    if not 2 <= len(parts) <= 3:
+      raise ValueError(f"{value} is not of the form rate/per/bucket.")
+    return cls(*parts)
+
+  def get_key(self, context):
+    if self.bucket == "user":
+      return context.author.id
+    if self.bucket == "channel":
+      return context.channel.id
+    return 0 # one bucket per guild, the guild is part of the key in TokenBucketLimiter
+
+@lru_cache(maxsize=64)
+def parse_command_rates(value):
+  # the COMMAND_RATES setting, e.g. "delete=2/10/channel; msg save=1/60/guild" -> {"delete":RateLimit, ...}
+  # cached by the setting string, so the setting is parsed only once
+  rates = {}
+  for entry in value.split(";"):
+    if not entry.strip():
+      continue
+    name, sep, rate = entry.partition("=")
+    if not sep:
+      raise ValueError(f"{entry} is not of the form command=rate/per/bucket.")
+    rates[" ".join(name.split()).lower()] = RateLimit.from_string(rate)
+  return rates
+
+def normalize_command_rates(value):
+  return "; ".join([f"{name}={rate}" for name, rate in parse_command_rates(str(value)).items()])
+
+class TokenBucketLimiter:
+  # token buckets in an OrderedDict ordered by the last access
+  # a bucket which refilled completely is the same as a new one, so these are dropped from the front
+  # and the number of buckets is bounded by max_size (the least recently used bucket is evicted)
+  def __init__(self, max_size=10000):
+    self.max_size = max_size
+    self.buckets = OrderedDict() # key -> [tokens, last update, time when full]
+
+  def hit(self, key, rate_limit, now=None):
+    # take a token from the bucket, returns 0.0 if the invocation is allowed, else the seconds to wait
+    if now is None:
+      now = time.monotonic()
+    self.expire(now)
+    bucket = self.buckets.get(key)
+    refill = rate_limit.rate / rate_limit.per
+    if bucket is None:
+      tokens = float(rate_limit.rate)
+    else:
+      tokens = min(float(rate_limit.rate), bucket[0] + (now - bucket[1]) * refill)
+      self.buckets.move_to_end(key)
+    if tokens < 1.0:
+      self.buckets[key] = [tokens, now, now + (rate_limit.rate - tokens) / refill]
+      return (1.0 - tokens) / refill
+    tokens -= 1.0
+    self.buckets[key] = [tokens, now, now + (rate_limit.rate - tokens) / refill]
+    while len(self.buckets) > self.max_size:
+      self.buckets.popitem(last=False)
+    return 0.0
+
+  def expire(self, now):
+    # amortized O(1), only looks at the least recently used buckets
+    while self.buckets:
+      key, bucket = next(iter(self.buckets.items()))
+      if bucket[2] > now:
+        break
+      del self.buckets[key]
+
+  def reset(self, key=None):
+    if key is None:
+      self.buckets.clear()
+    else:
+      self.buckets.pop(key, None)
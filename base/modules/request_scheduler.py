@@ -0,0 +1,121 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import time
+
+# lower is more urgent: moderation actions > replies to commands > log messages > cosmetic updates
+PRIORITIES = {"moderation":0, "reply":1, "log":2, "cosmetic":3}
+
+# the priority of the requests of the current task, commands set it in the before invoke hook
+_request_priority = contextvars.ContextVar("request_priority", default="reply")
+
+def set_request_priority(name):
+  if name not in PRIORITIES:
+    raise ValueError(f"unknown request priority {name}")
+  return _request_priority.set(name)
+
+@contextlib.contextmanager
+def request_priority(name):
+  # with request_priority("log"): await channel.send(...)
+  token = set_request_priority(name)
+  try:
+    yield
+  finally:
+    _request_priority.reset(token)
+
+class PriorityStats:
+  def __init__(self):
+    self.count = 0
+    self.queued = 0 # requests which had to wait
+    self.delay = 0.0
+    self.max_delay = 0.0
+
+  def add(self, delay):
+    self.count += 1
+    if delay > 0:
+      self.queued += 1
+      self.delay += delay
+      self.max_delay = max(self.max_delay, delay)
+
+class RequestScheduler:
+  # admits the requests of discord.py's http client, at most the budget of the route (e.g. 2) at the same time per
+  # rate limit bucket (route + channel/guild); discord.py waits for the bucket's rate limit and the 429 retries while
+  # the request holds its slot, so there is no global limit: a rate limited bucket never blocks the other buckets
+  # the requests waiting for a bucket are admitted by priority and then in order of arrival, so a flood of log
+  # messages or countdown edits in a channel does not delay the moderation actions in it
+  def __init__(self, route_budget=2, route_budgets=None):
+    self.route_budget = route_budget
+    self.route_budgets = route_budgets if route_budgets is not None else {} # route path -> budget
+    self.in_flight = 0
+    self.waiting = 0
+    self.buckets = {} # bucket -> requests in flight
+    self.waiters = {} # bucket -> heap of (priority, sequence, future)
+    self.sequence = itertools.count()
+    self.stats = {name:PriorityStats() for name in PRIORITIES}
+
+  def budget(self, route):
+    return self.route_budgets.get(route.path, self.route_budget)
+
+  def admit(self, bucket):
+    self.in_flight += 1
+    self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+  def release(self, bucket, budget):
+    self.in_flight -= 1
+    self.buckets[bucket] -= 1
+    if self.buckets[bucket] == 0:
+      del self.buckets[bucket]
+    self.wake(bucket, budget)
+
+  def wake(self, bucket, budget):
+    # admits the most urgent waiters of the bucket which fit into its budget
+    waiters = self.waiters.get(bucket)
+    while waiters and self.buckets.get(bucket, 0) < budget:
+      priority, sequence, future = heapq.heappop(waiters)
+      self.waiting -= 1
+      if future.done(): # cancelled
+        continue
+      self.admit(bucket)
+      future.set_result(None)
+    if not waiters:
+      self.waiters.pop(bucket, None)
+
+  async def acquire(self, route, priority):
+    bucket = route.bucket
+    budget = self.budget(route)
+    if bucket not in self.waiters and self.buckets.get(bucket, 0) < budget:
+      self.admit(bucket)
+      return bucket, budget
+    future = asyncio.get_event_loop().create_future()
+    heapq.heappush(self.waiters.setdefault(bucket, []), (PRIORITIES[priority], next(self.sequence), future))
+    self.waiting += 1
+    self.wake(bucket, budget)
+    try:
+      await future
+    except asyncio.CancelledError:
+      if future.done() and not future.cancelled(): # admitted at the same time
+        self.release(bucket, budget)
+      raise
+    return bucket, budget
+
+  async def request(self, request, route, *args, **kwargs):
+    priority = _request_priority.get()
+    start = time.perf_counter()
+    bucket, budget = await self.acquire(route, priority)
+    self.stats[priority].add(time.perf_counter() - start)
+    try:
+      return await request(route, *args, **kwargs)
+    finally:
+      self.release(bucket, budget)
+
+  def install(self, http):
+    # wrap the request method of discord's HTTPClient, every request goes through the scheduler
+    if getattr(http.request, "scheduled", False):
+      return
+    request = http.request
+    async def scheduled_request(route, *args, **kwargs):
+      return await self.request(request, route, *args, **kwargs)
+    scheduled_request.scheduled = True
+    http.request = scheduled_request
@@ -1,11 +1,12 @@
 import discord
+import asyncio
 import os
 import pytz
 from datetime import datetime, timedelta
 from base.modules.async_timer import BotTimer as Timer
 import json
 from base.modules.special_bot_methods import special_process_command
-from base.modules.constants import CACHE_PATH as path
+from base.modules.blob_store import blob_store
 
 def json_to_object(filename, convert_method):
   object_dict = {}
@@ -44,6 +45,8 @@ class MessageCache(SerializableObject):
     self["channel"] = None
     self["embed"] = None
     self["files"] = []
+    self.downloads = [] # (file name, task) of the attachments which are still downloading
+    self.missing = [] # the attachments which were skipped or could not be downloaded
   
   @classmethod
   async def from_message(cls, msg: discord.Message):
@@ -58,12 +61,7 @@ class MessageCache(SerializableObject):
         cache["embed"] = embed.to_dict()
         break
     # get all files attached
-    for attachment in msg.attachments:
-      try:
-        await attachment.save(f"{path}/{attachment.id}_{attachment.filename}")
-        cache["files"].append(f"{attachment.id}_{attachment.filename}")
-      except:
-        pass
+    cache.save_attachments(msg)
     return cache
   
   @classmethod
@@ -77,10 +75,37 @@ class MessageCache(SerializableObject):
     cache["files"] = dic["files"]
     return cache
     
+  def save_attachments(self, msg):
+    # the files are downloaded in the background into the blob store, wait_files waits for them
+    for attachment in msg.attachments:
+      file_name, download = blob_store.save_attachment(msg.guild.id if msg.guild is not None else 0, attachment)
+      if file_name is None:
+        self.missing.append(attachment.filename)
+        continue
+      self["files"].append(file_name)
+      if download is not None:
+        self.downloads.append((file_name, download))
+
+  async def wait_files(self):
+    # returns the file names of the attachments which were skipped or could not be downloaded
+    # the download of a name is shared by its owners, cancelling this wait must not cancel it for the others
+    downloads, self.downloads = self.downloads, []
+    results = await asyncio.gather(*[asyncio.shield(download) for file_name, download in downloads], return_exceptions=True)
+    for (file_name, download), result in zip(downloads, results):
+      if result is None or isinstance(result, BaseException): # the name has no file, release it
+        self["files"].remove(file_name)
+        blob_store.release(file_name)
+        self.missing.append(file_name.split("_", 1)[-1])
+    missing, self.missing = self.missing, []
+    return missing
+
   def del_files(self):
+    # a running download is not cancelled, the blob store drops the file if it has no other owner
+    self.downloads = []
+    self.missing = []
     for file_name in self["files"]:
       try:
-        os.remove(f"{path}/{file_name}")
+        blob_store.release(file_name)
       except:
         pass
     self["files"].clear()
@@ -88,8 +113,9 @@ class MessageCache(SerializableObject):
   def get_files(self):
     files = []
     for file_name in self["files"]:
-      if os.path.isfile(f"{path}/{file_name}"):
-        files.append(discord.File(f"{path}/{file_name}", filename=file_name.split("_", 1)[-1]))
+      file_path = blob_store.path(file_name)
+      if os.path.isfile(file_path):
+        files.append(discord.File(file_path, filename=file_name.split("_", 1)[-1]))
     return files
     
   def get_embed(self):
@@ -110,6 +136,7 @@ class MessageCache(SerializableObject):
     return (content, self.get_embed(), self.get_files())
     
   async def restore(self, context):
+    await self.wait_files()
     (content, embed_post, files) = self.restore_content(context)
     await context.send(content=content, embed=embed_post, files=files)
     self.del_files()
@@ -134,12 +161,7 @@ class MessageSchedule(MessageCache):
         cache["embed"] = embed.to_dict()
         break
     # get all files attached
-    for attachment in msg.attachments:
-      try:
-        await attachment.save(f"{path}/{attachment.id}_{attachment.filename}")
-        cache["files"].append(f"{attachment.id}_{attachment.filename}")
-      except:
-        pass
+    cache.save_attachments(msg)
     return cache
     
   @classmethod
@@ -186,6 +208,7 @@ class MessageSchedule(MessageCache):
     channel = guild.get_channel(self['channel'])
     member = guild.get_member(self["author"])
     embed_post = self.get_embed()
+    await self.wait_files()
     files = self.get_files()
     if not self['content'] and embed_post is None and len(files) == 0:
       text = f"{member.mention if member is not None else '@Unknown Member'} Here is a reminder that your scheduled time has arrived."
@@ -287,7 +310,7 @@ class SecretChannelEntry(SerializableObject):
         # expired
         hint_content = (f"Hey {user_mention}, don't forget to close the channel if it is not needed anymore. "
           f"If no more messages are sent within the next {expiry} minutes, this channel will be closed automatically.\n"
-          f"Send `?modmail alive` to prevent this channel from closing.")
+          f"Send `{cog.bot.get_guild_prefix(guild)}modmail alive` to prevent this channel from closing.")
         if last_msg is not None and last_msg.author.id == cog.bot.user.id and last_msg.content == hint_content:
           # delete the channel
           await cog.delete_secret_channel(channel, user, "Auto deleted because of no activity")
@@ -0,0 +1,150 @@
+import math
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+# the columns of user_statistics in the order they are loaded
+STAT_COLUMNS = ("userid", "total_messages", "total_commands", "total_words", "total_reacts", "reacts_to_own")
+PERCENTILES = (25, 50, 75, 90, 99)
+
+def load_statistic_columns(db, pending=None):
+  # load user_statistics as column arrays with a single query
+  # pending is the not yet saved bot.user_stats of the guild which is merged into the columns
+  rows = db.query(f"SELECT {', '.join(STAT_COLUMNS)} FROM user_statistics")
+  if rows:
+    columns = {k:list(v) for k,v in zip(STAT_COLUMNS, zip(*rows))}
+  else:
+    columns = {k:[] for k in STAT_COLUMNS}
+  if pending:
+    index = {userid:i for i, userid in enumerate(columns["userid"])}
+    for userid, stat in pending.items():
+      values = (stat["messages"], stat["commands"], stat["words"], stat["reactions"], stat["reacts_to_own"])
+      if userid in index:
+        i = index[userid]
+        for k, v in zip(STAT_COLUMNS[1:], values):
+          columns[k][i] += v
+      else:
+        columns["userid"].append(userid)
+        for k, v in zip(STAT_COLUMNS[1:], values):
+          columns[k].append(v)
+  return columns
+
+def _ratio(num, den):
+  return float(num)/den if den > 0 else 0.0
+
+def _percentiles_py(sorted_values, percentiles):
+  # linear interpolation between the closest ranks, the same as numpy's default
+  n = len(sorted_values)
+  result = []
+  for p in percentiles:
+    rank = (n-1)*p/100.0
+    low = math.floor(rank)
+    high = min(low+1, n-1)
+    result.append(sorted_values[low] + (sorted_values[high]-sorted_values[low])*(rank-low))
+  return result
+
+def _gini_py(sorted_values):
+  # gini coefficient of a list sorted ascending, 0 is perfect equality and 1 is total concentration
+  n = len(sorted_values)
+  total = sum(sorted_values)
+  if n == 0 or total <= 0:
+    return 0.0
+  weighted = sum(i*v for i, v in enumerate(sorted_values, 1))
+  return 2.0*weighted/(n*total) - (n+1.0)/n
+
+def _server_statistics_py(columns, percentiles):
+  messages = columns["total_messages"]
+  words = columns["total_words"]
+  total_msg = sum(messages)
+  total_cmd = sum(columns["total_commands"])
+  sorted_msg = sorted(messages)
+  sorted_wrd = sorted(words)
+  return {
+    "users":len(messages),
+    "active_users":sum(1 for m in messages if m > 0),
+    "messages":total_msg,
+    "commands":total_cmd,
+    "words":sum(words),
+    "reactions":sum(columns["total_reacts"]),
+    "reacts_to_own":sum(columns["reacts_to_own"]),
+    "message_percentiles":_percentiles_py(sorted_msg, percentiles),
+    "word_percentiles":_percentiles_py(sorted_wrd, percentiles),
+    "message_gini":_gini_py(sorted_msg),
+    "word_gini":_gini_py(sorted_wrd),
+    "top_1_percent_share":_ratio(sum(sorted_msg[len(sorted_msg)-max(len(sorted_msg)//100, 1):]), total_msg),
+  }
+
+def _gini_np(sorted_values):
+  n = sorted_values.size
+  total = sorted_values.sum()
+  if n == 0 or total <= 0:
+    return 0.0
+  weighted = np.dot(np.arange(1, n+1, dtype=np.float64), sorted_values)
+  return float(2.0*weighted/(n*total) - (n+1.0)/n)
+
+def _server_statistics_np(columns, percentiles):
+  messages = np.asarray(columns["total_messages"], dtype=np.int64)
+  words = np.asarray(columns["total_words"], dtype=np.int64)
+  sorted_msg = np.sort(messages)
+  sorted_wrd = np.sort(words)
+  total_msg = int(messages.sum())
+  top = max(sorted_msg.size//100, 1)
+  return {
+    "users":int(messages.size),
+    "active_users":int(np.count_nonzero(messages > 0)),
+    "messages":total_msg,
+    "commands":int(np.asarray(columns["total_commands"], dtype=np.int64).sum()),
+    "words":int(words.sum()),
+    "reactions":int(np.asarray(columns["total_reacts"], dtype=np.int64).sum()),
+    "reacts_to_own":int(np.asarray(columns["reacts_to_own"], dtype=np.int64).sum()),
+    "message_percentiles":np.percentile(sorted_msg, percentiles).tolist(),
+    "word_percentiles":np.percentile(sorted_wrd, percentiles).tolist(),
+    "message_gini":_gini_np(sorted_msg.astype(np.float64)),
+    "word_gini":_gini_np(sorted_wrd.astype(np.float64)),
+    "top_1_percent_share":_ratio(int(sorted_msg[-top:].sum()), total_msg),
+  }
+
+def server_statistics(columns, percentiles=PERCENTILES, use_numpy=True):
+  # compute the server-wide distributions, returns None if there is no user
+  if len(columns["total_messages"]) == 0:
+    return None
+  if use_numpy and np is not None:
+    stats = _server_statistics_np(columns, percentiles)
+  else:
+    stats = _server_statistics_py(columns, percentiles)
+  stats["percentiles"] = list(percentiles)
+  stats["command_ratio"] = _ratio(stats["commands"], stats["messages"])
+  stats["words_per_message"] = _ratio(stats["words"], stats["messages"]-stats["commands"])
+  stats["reaction_self_ratio"] = _ratio(stats["reacts_to_own"], stats["reactions"])
+  return stats
+
+def format_percentiles(percentiles, values):
+  return " / ".join([f"p{p}: {round(v, 1)}" for p, v in zip(percentiles, values)])
+
+if __name__ == "__main__":
+  # benchmark on synthetic users: python -m base.modules.server_statistics [num_users]
+  import random
+  import sys
+  import time
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+  rng = random.Random(0)
+  messages = [int(rng.paretovariate(1.2)) - 1 for i in range(n)]
+  columns = {
+    "userid":list(range(n)),
+    "total_messages":messages,
+    "total_commands":[m//10 for m in messages],
+    "total_words":[m*rng.randint(1, 12) for m in messages],
+    "total_reacts":[rng.randint(0, 50) for i in range(n)],
+    "reacts_to_own":[rng.randint(0, 3) for i in range(n)],
+  }
+  paths = [("python", False)]
+  if np is not None:
+    paths.append(("numpy", True))
+  for name, use_numpy in paths:
+    start = time.perf_counter()
+    stats = server_statistics(columns, use_numpy=use_numpy)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>6}: {n} users in {elapsed:.3f}s, "
+          f"messages {format_percentiles(stats['percentiles'], stats['message_percentiles'])}, "
+          f"gini {stats['message_gini']:.4f}")
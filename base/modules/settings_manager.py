@@ -45,10 +45,12 @@ class DefaultSetting:
 
 
 class Settings:
-
-  def __init__(self, database, **kwargs):
+  # defaults is a dict: name -> DefaultSetting, used to keep the transformed value of each setting in self.typed
+  # self.typed is recomputed only when a setting changes, so reading a setting is a single dict access
+  def __init__(self, database, defaults=None, **kwargs):
     self.db = database
     self.id = self.db.id
+    self.defaults = defaults if defaults is not None else {}
     self.db.create_table("bot_settings", "name", name="txt", value="txt", description="txt")
     
     # load the db content to memory
@@ -66,6 +68,25 @@ class Settings:
     if result is not None:
       for row in result:
         self.memory[row["name"]] = [row["value"], row["description"]]
+    self.typed = {}
+    for key in set(self.memory) | set(self.defaults):
+      self.update_typed(key)
+
+  def update_typed(self, key):
+    # store the transformed value of a setting, falls back to the default if the stored value cannot be transformed
+    default = self.defaults.get(key)
+    if key in self.memory:
+      value = self.memory[key][0]
+      if default is not None:
+        try:
+          value = default.transform_setting(value)
+        except:
+          value = default.default
+      self.typed[key] = value
+    elif default is not None:
+      self.typed[key] = default.default
+    else:
+      self.typed.pop(key, None)
 
   def get(self, key):
     if key not in self.memory:
@@ -77,12 +98,14 @@ class Settings:
       raise LookupError(f"{key} does not exist.")
     self.db.insert_or_update("bot_settings", key, value, self.memory[key][1])
     self.memory[key][0] = value
+    self.update_typed(key)
 
   def add(self, key, value):
     if key in self.memory:
       raise LookupError(f"{key} already exists.")
     self.db.insert_or_update("bot_settings", key, value, "no description")
     self.memory[key] = [value, "no description"]
+    self.update_typed(key)
 
   def add_description(self, key, value):
     if key not in self.memory:
@@ -95,9 +118,36 @@ class Settings:
       raise LookupError(f"t{key} does not exist.")
     self.db.delete_row("bot_settings", key)
     self.memory.pop(key, None)
+    self.update_typed(key)
 
   def info(self):
     max_len = str(max([len(k) for k in self.memory])+1)
     template_str = "  {0:__STR_FORMAT_LEN__} {1}".replace("__STR_FORMAT_LEN__", max_len)
     setting_str = "\n".join([template_str.format(f"{k}:", v[1]) for k,v in self.memory.items()])
     return "\n".join(["Possible Settings:", setting_str])
+
+if __name__ == "__main__":
+  # micro-benchmark of reading a setting: python -m base.modules.settings_manager
+  import os
+  import tempfile
+  import timeit
+  os.chdir(tempfile.mkdtemp())
+  os.mkdir("db")
+  defaults = {
+    "MAX_WARNINGS":DefaultSetting(name="MAX_WARNINGS", default=4, transFun=lambda x: int(x), checkFun=lambda x: x>0),
+    "ACTIVE_TIME":DefaultSetting(name="ACTIVE_TIME", default=2, transFun=lambda x: float(x), checkFun=lambda x: x>0),
+    "MOD_LOG":DefaultSetting(name="MOD_LOG", default="ON", transFun=lambda x: x.upper(), checkFun=lambda x: x in ["ON", "OFF"]),
+  }
+  settings = Settings(Database("benchmark"), defaults)
+  for key, setting in defaults.items():
+    settings.add(key, setting.default)
+  def transformed_get(key):
+    # the previous way: look up the stored string and transform it on every call
+    value = settings.get(key)
+    return defaults[key].transform_setting(value)
+  n = 1000000
+  for key in defaults:
+    assert transformed_get(key) == settings.typed[key]
+    before = timeit.timeit(lambda: transformed_get(key), number=n)
+    after = timeit.timeit(lambda: settings.typed[key], number=n)
+    print(f"{key:>12}: get+transform {before/n*1e9:.0f}ns, typed {after/n*1e9:.0f}ns")
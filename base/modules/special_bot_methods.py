@@ -13,39 +13,18 @@ async def special_get_context(bot, message, cmdtext, *, cls=Context):
   if bot._skip_check(message.author.id, bot.user.id):
     return ctx
 
-  prefix = await bot.get_prefix(message)
-  invoked_prefix = prefix
-
-  if isinstance(prefix, str):
-    if not view.skip_string(prefix):
-      return ctx
-  else:
-    try:
-      # if the context class' __init__ consumes something from the view this
-      # will be wrong.  That seems unreasonable though.
-      if cmdtext.startswith(tuple(prefix)):
-        invoked_prefix = discord.utils.find(view.skip_string, prefix)
-      else:
-        return ctx
-
-    except TypeError:
-      if not isinstance(prefix, list):
-         raise TypeError("get_prefix must return either a string or a list of string, "
-                         "not {}".format(prefix.__class__.__name__))
-
-       # It's possible a bad command_prefix got us here.
-      for value in prefix:
-        if not isinstance(value, str):
-          raise TypeError("Iterable command_prefix or list returned from get_prefix must "
-                          "contain only strings, not {}".format(value.__class__.__name__))
-
-      # Getting here shouldn't happen
-      raise
+  # the cached prefix matcher of the guild, the longest matching prefix is used
+  matcher = await bot.get_message_prefix_matcher(message)
+  invoked_prefix, prefix_count = matcher.match(cmdtext)
+  if invoked_prefix is None or not view.skip_string(invoked_prefix):
+    return ctx
 
   invoker = view.get_word()
   ctx.invoked_with = invoker
   ctx.prefix = invoked_prefix
   ctx.command = bot.all_commands.get(invoker)
+  if ctx.command is None and invoker and message.guild is not None:
+    ctx.command = bot.get_custom_command(message.guild, invoker)
   return ctx
   
 async def special_process_command(bot, message, cmdtext):
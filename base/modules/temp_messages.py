@@ -0,0 +1,82 @@
+import asyncio
+import heapq
+import itertools
+import time
+import discord
+from base.modules.request_scheduler import request_priority
+
+class TempMessageManager:
+  # deletes messages when they expire, a single task waits for the earliest expiry in a heap
+  # messages of the same channel which expire within `grace` seconds are deleted together with one bulk delete
+  def __init__(self, grace=1.0):
+    self.grace = grace
+    self.heap = [] # (expiry, sequence, message)
+    self.sequence = itertools.count()
+    self.wakeup = None
+    self.task = None
+    self.stopping = False
+    self.deleted = 0
+    self.requests = 0
+
+  def add(self, message, timeout):
+    expires = time.time() + timeout
+    heapq.heappush(self.heap, (expires, next(self.sequence), message))
+    if self.task is None or self.task.done():
+      self.wakeup = asyncio.Event()
+      self.task = asyncio.ensure_future(self.run())
+    elif self.heap[0][2] is message: # earlier than the expiry the task waits for
+      self.wakeup.set()
+    return expires
+
+  async def run(self):
+    with request_priority("cosmetic"): # deleting temporary messages is never urgent
+      while self.heap and not self.stopping:
+        timeout = self.heap[0][0] - time.time()
+        if timeout > 0:
+          self.wakeup.clear()
+          try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+            continue # a message with an earlier expiry was added
+          except asyncio.TimeoutError:
+            pass
+        await self.delete_expired(time.time() + self.grace)
+
+  async def delete_expired(self, until):
+    channels = {}
+    while self.heap and self.heap[0][0] <= until:
+      expires, sequence, message = heapq.heappop(self.heap)
+      channels.setdefault(message.channel.id, (message.channel, []))[1].append(message)
+    await asyncio.gather(*[self.delete(channel, messages) for channel, messages in channels.values()])
+
+  async def delete(self, channel, messages):
+    # bulk deletes need manage_messages and do not work in DMs, the messages are deleted one by one then
+    for i in range(0, len(messages), 100):
+      chunk = messages[i:i+100]
+      if len(chunk) > 1 and isinstance(channel, discord.TextChannel):
+        try:
+          await channel.delete_messages(chunk)
+          self.requests += 1
+          self.deleted += len(chunk)
+          continue
+        except discord.HTTPException:
+          pass
+      for message in chunk:
+        try:
+          await message.delete()
+          self.requests += 1
+          self.deleted += 1
+        except discord.HTTPException:
+          pass
+
+  async def flush(self):
+    # deletes all pending messages now, e.g. before the bot closes
+    # the task is stopped instead of cancelled, the messages of a running delete_expired are already off the heap
+    if self.task is not None and not self.task.done():
+      self.stopping = True
+      self.wakeup.set()
+      await asyncio.wait([self.task])
+    self.task = None
+    self.stopping = False
+    await self.delete_expired(float("inf"))
+
+temp_messages = TempMessageManager()
@@ -1,20 +1,37 @@
 import random
+import asyncio
 import traceback
 import time
 import json
-import re
 from datetime import datetime
 
 import discord
 from discord.ext import commands
-
-from base.modules.custom_commands import add_cmd_from_row
+from discord.http import Route
+
+from base.modules.custom_commands import GuildCommands
+from base.modules.rate_limiter import TokenBucketLimiter, parse_command_rates, normalize_command_rates
+from base.modules.command_metrics import CommandMetrics, install_http_timing
+from base.modules.access_checks import AuthorizationCache, is_mod_or_admin
+from base.modules.permission_sync import overwrites_differ, overwrite_differs
+from base.modules.permission_jobs import PermissionPropagator
+from base.modules.log_queue import LogQueue
+from base.modules.temp_messages import temp_messages
+from base.modules.attachment_downloader import downloader
+from base.modules.request_scheduler import RequestScheduler, request_priority, set_request_priority
+from base.modules.log_webhooks import LogWebhooks
+from base.modules.event_log import EventLog
+from base.modules.error_suppression import ErrorSuppressor
+from base.modules.constants import LOG_PATH
+from base.modules.prefix_matcher import get_prefix_matcher, get_setting_matcher, normalize_prefix_setting, count_message
 from base.modules.db_manager import Database
 from base.modules.settings_manager import Settings
 from base.modules.settings_manager import DefaultSetting
 
 class BaseBot(commands.Bot):
 
+  init_concurrency = 4 # number of guilds which are initialized at the same time
+
   games = [
     "The Legend of Zelda: A Link to the Past","The Legend of Zelda: Ocarina of Time","The Legend of Zelda: Majora's Mask","The Legend of Zelda: The Wind Waker",
     "Super Mario 64","Super Mario Galaxy","Pokemon Red","Pokemon Blue","Pokemon Gold","Pokemon Silver",
@@ -34,15 +51,30 @@ class BaseBot(commands.Bot):
     "The Promised Neverland", "Kami no Tou", 
   ]
 
+  async def get_prefix(self, message):
+    # guild prefixes come from the PREFIX setting, DMs use the command_prefix of the bot
+    if message.guild is not None:
+      return self.get_guild_prefix_matcher(message.guild).prefixes
+    return await super().get_prefix(message)
+
+  def get_guild_prefix_matcher(self, guild):
+    # the settings keep the PREFIX string and the matcher is cached by that string, so there is no db access here
+    return get_setting_matcher(self.get_setting(guild, "PREFIX"))
+
+  def get_guild_prefix(self, guild):
+    # the prefix shown in help texts and hints
+    return self.get_guild_prefix_matcher(guild).default
+
+  async def get_message_prefix_matcher(self, message):
+    if message.guild is not None:
+      return self.get_guild_prefix_matcher(message.guild)
+    return get_prefix_matcher(await self.get_prefix(message))
+
   async def find_prefix(self, message):
-    prefix = await self.get_prefix(message)
-    if type(prefix) == list:
-      for pre in prefix:
-        if message.startswith(pre):
-          return pre
-      else:
-        return None
-    return prefix
+    # the prefix used by the message, or the default prefix if the message does not start with one
+    matcher = await self.get_message_prefix_matcher(message)
+    prefix, prefix_count = matcher.match(message.content)
+    return prefix if prefix is not None else matcher.default
 
   def get_channel(self, guild, **kwargs):
     return discord.utils.get(guild.text_channels, **kwargs)
@@ -52,9 +84,13 @@ class BaseBot(commands.Bot):
       return guild.me.name
     return guild.me.nick
     
-  async def log_error(self, guild, *, title, description=None, timestamp=None, fields:dict=None):
+  async def log_error(self, guild, *, title, description=None, timestamp=None, fields:dict=None, signature=None):
+    # errors with the same signature are posted once per window, the repetitions are summarized later
+    self.event_log.write("error", guild, title, description, fields, timestamp)
     if not self.get_setting(guild, "ERROR_LOG") == "ON":
       return
+    if signature is not None and not self.error_suppressor.hit(guild.id, signature, title, fields):
+      return
     if timestamp is None:
       timestamp = datetime.utcnow()
     embed = discord.Embed(title=title, description=description, colour=discord.Colour.red(), timestamp=timestamp)
@@ -63,9 +99,10 @@ class BaseBot(commands.Bot):
         if key and value:
           embed.add_field(name=f"{key}:", value=f"{value}", inline=False)
     embed.set_footer(text="ERROR LOG")
-    await self.get_log(guild, "error-log").send(embed=embed)
+    await self.get_log_queue(guild).put("error-log", embed)
     
   async def log_mod(self, guild, *, title, description=None, timestamp=None, fields:dict=None):
+    self.event_log.write("mod", guild, title, description, fields, timestamp)
     if not self.get_setting(guild, "MOD_LOG") == "ON":
       return
     if timestamp is None:
@@ -76,9 +113,10 @@ class BaseBot(commands.Bot):
         if key and value:
           embed.add_field(name=f"{key}:", value=f"{value}", inline=False)
     embed.set_footer(text="MOD LOG")
-    await self.get_log(guild, "mod-log").send(embed=embed)
+    await self.get_log_queue(guild).put("mod-log", embed)
     
   async def log_admin(self, guild, *, title, description=None, timestamp=None, fields:dict=None):
+    self.event_log.write("admin", guild, title, description, fields, timestamp)
     if not self.get_setting(guild, "ADMIN_LOG") == "ON":
       return
     if timestamp is None:
@@ -89,32 +127,88 @@ class BaseBot(commands.Bot):
         if key and value:
           embed.add_field(name=f"{key}:", value=f"{value}", inline=False)
     embed.set_footer(text="ADMIN LOG")
-    await self.get_log(guild, "admin-log").send(embed=embed)
+    await self.get_log_queue(guild).put("admin-log", embed)
+
+  async def log_maintenance(self, guild, *, title, fields:dict=None):
+    # routine messages of the periodic tasks, only posted in the mod log if MAINTENANCE_LOG is on
+    if self.get_setting(guild, "MAINTENANCE_LOG") == "ON":
+      await self.log_mod(guild, title=title, fields=fields)
+    else:
+      self.event_log.write("maintenance", guild, title, None, fields, None)
+
+  async def report_suppressed_errors(self, interval=60):
+    # posts one summary per suppressed error signature after its window ended
+    while not self.is_closed():
+      await asyncio.sleep(interval)
+      for guild_id, title, fields, count in self.error_suppressor.pop_summaries():
+        guild = self.get_guild(guild_id)
+        if guild is None:
+          continue
+        try:
+          await self.log_error(guild, title=f"{title} (repeated)", fields=fields,
+                               description=f"Occurred {count} more time(s) within {self.error_suppressor.window/60:.0f} minutes of the first one.")
+        except Exception:
+          traceback.print_exc()
+
+  def get_log_queue(self, guild):
+    # the log embeds are queued and sent in batches, so logging does not delay the commands
+    if guild.id not in self.log_queues:
+      guild_id = guild.id
+      self.log_queues[guild.id] = LogQueue(lambda name, embeds: self.send_queued_log_embeds(guild_id, name, embeds))
+    return self.log_queues[guild.id]
+
+  async def send_queued_log_embeds(self, guild_id, name, embeds):
+    # the guild is looked up when the batch is sent, a reconnect which could not resume creates new guild objects
+    guild = self.get_guild(guild_id)
+    if guild is None: # the bot left the guild, the batch is dropped
+      return
+    await self.send_log_embeds(guild, name, embeds)
+
+  async def send_log_embeds(self, guild, name, embeds):
+    # sends up to 10 embeds as one message, discord.py's send only supports a single embed
+    with request_priority("log"): # logs wait for moderation actions and replies
+      log = self.get_log(guild, name)
+      if log is None:
+        return
+      if self.get_setting(guild, "LOG_WEBHOOK") == "ON":
+        # separates the log traffic from the replies to commands, falls back to sending in the channel
+        if await self.log_webhooks.send(log, embeds, username=self.get_bot_name(guild), avatar_url=self.user.avatar_url):
+          return
+      if len(embeds) == 1:
+        await log.send(embed=embeds[0])
+        return
+      try:
+        await self.http.request(Route("POST", "/channels/{channel_id}/messages", channel_id=log.id),
+                                json={"embeds":[embed.to_dict() for embed in embeds]})
+      except discord.HTTPException as e:
+        if e.status != 400:
+          raise
+        for embed in embeds: # e.g. an invalid embed, send the others one by one
+          try:
+            await log.send(embed=embed)
+          except discord.HTTPException:
+            traceback.print_exc()
 
   def get_setting(self, guild, setting_name):
+    # the settings keep the transformed values, so this is a single dict access in most cases
     try:
-      value = self.settings[guild.id].get(setting_name)
-    except Exception as e:
+      return self.settings[guild.id].typed[setting_name]
+    except KeyError:
       if setting_name in self.default_settings:
-        value = self.default_settings[setting_name].default
-      else:
-        raise e
-    if setting_name in self.default_settings:
-      try:
-        value = self.default_settings[setting_name].transform_setting(value)
-      except:
-        value = self.default_settings[setting_name].default
-    return value
+        return self.default_settings[setting_name].default
+      raise LookupError(f"{setting_name} does not exist.")
 
   async def set_setting(self, guild, setting_name, value, context=None):
     # type check and adapt the settings in the bot's guild if there is a change in settings db
     if setting_name in self.default_settings and context is not None:
       value = await self.default_settings[setting_name].adapt_setting(value, context)
     self.settings[guild.id].set(setting_name, value)
+    self.invalidate_guild_objects(guild)
     return value
 
   def add_setting(self, guild, setting_name, value, description=None):
     self.settings[guild.id].add(setting_name, value)
+    self.invalidate_guild_objects(guild)
     if description is not None:
       self.add_setting_description(guild, setting_name, description)
 
@@ -123,21 +217,25 @@ class BaseBot(commands.Bot):
 
   def rm_setting(self, guild, setting_name):
     self.settings[guild.id].rm(setting_name)
+    self.invalidate_guild_objects(guild)
 
 
   async def init_bot(self, guild):
     if guild.me.nick is None:
-      await guild.me.edit(nick="A Bot")
+      with request_priority("cosmetic"):
+        await guild.me.edit(nick="A Bot")
     if guild.id not in self.db:
       self.db[guild.id] = Database(guild.id)
     if guild.id not in self.user_stats:
       self.user_stats[guild.id] = {}
     if guild.id not in self.settings:
-      self.settings[guild.id] = Settings(self.db[guild.id])
+      self.settings[guild.id] = Settings(self.db[guild.id], self.default_settings)
       self.add_default_settings(guild)
     await self.create_roles(guild)
+    self.permission_jobs.resume(guild)
     await self.create_logs(guild)
     self.create_tables(guild)
+    self.get_guild_commands(guild) # the custom commands are loaded from the db on first use
     time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     for cog in self.cogs.values():
       # you can initialze your cog during a guild join if you have init_guild() function for guild
@@ -150,46 +248,102 @@ class BaseBot(commands.Bot):
     except:
       pass
     
+  def get_guild_commands(self, guild):
+    # the registry of the custom commands of a guild
+    if guild.id not in self.custom_commands:
+      self.custom_commands[guild.id] = GuildCommands(self, self.db[guild.id])
+    return self.custom_commands[guild.id]
+
+  def get_custom_command(self, guild, name):
+    if guild.id not in self.custom_commands:
+      return None
+    return self.custom_commands[guild.id].get_custom_command(name)
+
+  async def get_context(self, message, *, cls=commands.Context):
+    # the custom commands are not registered in the bot, look them up in the registry of the guild
+    context = await super().get_context(message, cls=cls)
+    if context.command is None and context.invoked_with and message.guild is not None:
+      context.command = self.get_custom_command(message.guild, context.invoked_with)
+    return context
+
+  async def before_command_invoke(self, context):
+    # token bucket rate limits, custom commands set them in their attributes and built-in commands in COMMAND_RATES
+    # the limits of COMMAND_RATES do not apply to mods, admins and the owners, e.g. purging during a raid
+    # the discord requests of the command are scheduled with the priority of its cog (moderation or reply)
+    set_request_priority(getattr(context.cog, "request_priority", "reply"))
+    if context.guild is None:
+      self.command_metrics.start(context)
+      return
+    rate_limit = getattr(context.command, "rate_limit", None)
+    if rate_limit is None and not is_mod_or_admin(self, context.guild, context.author):
+      rate_limit = parse_command_rates(self.get_setting(context.guild, "COMMAND_RATES")).get(context.command.qualified_name.lower())
+    if rate_limit is not None:
+      key = (context.guild.id, context.command.qualified_name, rate_limit.get_key(context))
+      retry_after = self.rate_limiter.hit(key, rate_limit)
+      if retry_after > 0:
+        raise commands.CommandOnCooldown(commands.Cooldown(rate_limit.rate, rate_limit.per, commands.BucketType.user), retry_after)
+    self.command_metrics.start(context)
+
+  async def after_command_invoke(self, context):
+    # also called if the command raised an error, context.command_failed is the outcome
+    self.command_metrics.finish(context)
+
   def load_custom_commands(self, guild):
-    #Add all stores user_commands
-    cmds = self.db[guild.id].select("user_commands")
-    if cmds is not None:
-      cmds.sort(key=lambda cmd: cmd["cmdname"])
-      for cmd in cmds:
-        try:
-          add_cmd_from_row(self, cmd)
-        except Exception as e:
-          print(f"Error when adding command {cmd['cmdname']}: {e}")
+    # the custom commands are loaded on first use, this materializes all stored user_commands at once
+    self.get_guild_commands(guild).load_all()
+
+  def resolve_guild_object(self, guild, key, getter, finder):
+    # resolve a bot-managed role/channel through a per-guild id cache
+    # getter maps an id to the object in O(1), finder scans the guild and is only called on a cache miss
+    # the cache is invalidated on role/channel updates and deletes and on setting changes
+    cache = self.resolved_ids.setdefault(guild.id, {})
+    obj_id = cache.get(key)
+    if obj_id is not None:
+      obj = getter(obj_id)
+      if obj is not None:
+        return obj
+    obj = finder()
+    if obj is not None:
+      cache[key] = obj.id
+    else:
+      cache.pop(key, None)
+    return obj
+
+  def invalidate_guild_objects(self, guild):
+    self.resolved_ids.pop(guild.id, None)
+    self.auth_cache.invalidate_guild(guild)
+
+  def get_role_by_setting(self, guild, setting_name):
+    name = self.get_setting(guild, setting_name)
+    return self.resolve_guild_object(guild, ("role", name), guild.get_role,
+                                     lambda: discord.utils.get(guild.roles, name=name))
 
   def get_log(self, guild, name):
     bot_category = self.get_bot_category(guild)
     if bot_category is None:
       return None
-    return discord.utils.get(guild.text_channels, name=name, category_id=bot_category.id)
+    return self.resolve_guild_object(guild, ("log", name, bot_category.id), guild.get_channel,
+                                     lambda: discord.utils.get(guild.text_channels, name=name, category_id=bot_category.id))
 
   def get_mod_role(self, guild):
-    name = self.get_setting(guild, "MOD_ROLE_NAME")
-    return discord.utils.get(guild.roles, name=name)
+    return self.get_role_by_setting(guild, "MOD_ROLE_NAME")
     
   def get_admin_role(self, guild):
-    name = self.get_setting(guild, "ADMIN_ROLE_NAME")
-    return discord.utils.get(guild.roles, name=name)
+    return self.get_role_by_setting(guild, "ADMIN_ROLE_NAME")
 
   def get_bot_role(self, guild):
-    name = self.get_setting(guild, "BOT_ROLE_NAME")
-    return discord.utils.get(guild.roles, name=name)
+    return self.get_role_by_setting(guild, "BOT_ROLE_NAME")
 
   def get_cmd_role(self, guild):
-    name = self.get_setting(guild, "CMD_ROLE_NAME")
-    return discord.utils.get(guild.roles, name=name)
+    return self.get_role_by_setting(guild, "CMD_ROLE_NAME")
 
   def get_mute_role(self, guild):
-    name = self.get_setting(guild, "MUTE_ROLE_NAME")
-    return discord.utils.get(guild.roles, name=name)
+    return self.get_role_by_setting(guild, "MUTE_ROLE_NAME")
 
   def get_bot_category(self, guild):
     name = self.get_setting(guild, "BOT_CATEGORY_NAME")
-    return discord.utils.get(guild.categories, name=name)
+    return self.resolve_guild_object(guild, ("category", name), guild.get_channel,
+                                     lambda: discord.utils.get(guild.categories, name=name))
 
   async def set_random_status(self):
     n = random.randint(0,1)
@@ -220,6 +374,11 @@ class BaseBot(commands.Bot):
   #This global command error handler just adds the embed to the error log.
   #Any additional stuff should be done before calling this handler from the subclass.
   async def on_command_error(self, context, error):
+    if isinstance(error, commands.CommandOnCooldown):
+      # rate limited invocations are answered here for all commands and not logged
+      if context.command is not None:
+        await context.send(f"Sorry {context.author.mention}, but `{context.prefix}{context.command.qualified_name}` is rate limited. Try again in {error.retry_after:.0f}s.")
+      return
     title = f"A {error.__class__.__name__} occured"
     if hasattr(error, "original"):
       error = error.original
@@ -227,7 +386,8 @@ class BaseBot(commands.Bot):
               "Channel":f"{context.message.channel.mention}",
               "Command":f"{context.message.content}",
              f"{error.__class__.__name__}":f"{error}"}
-    await self.log_error(context.guild, title=title, fields=fields, timestamp=context.message.created_at)
+    signature = ("command", context.command.qualified_name if context.command is not None else None, error.__class__.__name__, str(error))
+    await self.log_error(context.guild, title=title, fields=fields, timestamp=context.message.created_at, signature=signature)
   
   # the error handler for task, need to be called in try except block in each task
   async def on_task_error(self, task, error, guild):
@@ -236,7 +396,7 @@ class BaseBot(commands.Bot):
       error = error.original
     fields = {"Task":task,
              f"{error.__class__.__name__}":f"{error}"}
-    await self.log_error(guild, title=title, fields=fields)
+    await self.log_error(guild, title=title, fields=fields, signature=("task", task, error.__class__.__name__, str(error)))
 
   def create_tables(self, guild):
     if "user_warnings" not in self.db[guild.id]:
@@ -247,6 +407,8 @@ class BaseBot(commands.Bot):
       self.db[guild.id].create_table("user_statistics", "userid", userid="int", total_messages="int", total_commands="int", total_words="int", total_reacts="int", reacts_to_own="int")
     if "user_commands" not in self.db[guild.id]:
       self.db[guild.id].create_table("user_commands", "cmdname", cmdname="txt", message="txt", attributes="txt", isgroup="int_not_null", lock="int_not_null")
+    if "user_command_usage" not in self.db[guild.id]:
+      self.db[guild.id].create_table("user_command_usage", "cmdname", cmdname="txt", count="int_not_null", last_used="real")
     if "messages" not in self.db[guild.id]:
       self.db[guild.id].create_table("messages", "mid", mid="int", time="real", aid="int", author="txt", cid="int", channel="txt", content="txt", embeds="txt", files="txt")
 
@@ -263,7 +425,7 @@ class BaseBot(commands.Bot):
         category=bot_category,
         position=0,
       )
-    #Channel permissions for the bot
+    #Channel permissions for the bot, the log channels are only edited if their cached overwrites differ
     permissions = {
       guild.me: discord.PermissionOverwrite(
         create_instant_invite=True, manage_channels=True, manage_roles=True, manage_webhooks=True, read_messages=True,
@@ -303,7 +465,7 @@ class BaseBot(commands.Bot):
         overwrites=permissions,
         reason="A channel to log all bot errors."
       )
-    else:
+    elif overwrites_differ(error_log, permissions):
       await error_log.edit(overwrites=permissions)
     admin_log = discord.utils.get(guild.text_channels, name="admin-log", category_id=bot_category.id)
     if admin_log is None:
@@ -315,7 +477,7 @@ class BaseBot(commands.Bot):
         overwrites=permissions,
         reason="A channel to log all administration actions"
       )
-    else:
+    elif overwrites_differ(admin_log, permissions):
       await admin_log.edit(overwrites=permissions)
     #Before creating the mod log, add the permissions.
     mod_role = self.get_mod_role(guild)
@@ -334,8 +496,8 @@ class BaseBot(commands.Bot):
         overwrites=permissions,
         reason="A channel to log all moderation actions"
       )
-    else:
-       await mod_log.edit(overwrites=permissions)
+    elif overwrites_differ(mod_log, permissions):
+      await mod_log.edit(overwrites=permissions)
 
   async def create_roles(self, guild):
     bot_role = self.get_bot_role(guild)
@@ -352,7 +514,8 @@ class BaseBot(commands.Bot):
         hoist=True,
         mentionable=True
       )
-    await guild.me.add_roles(bot_role)
+    if bot_role not in guild.me.roles:
+      await guild.me.add_roles(bot_role)
     admin_role = self.get_admin_role(guild)
     if admin_role is None:
       admin_role = await guild.create_role(
@@ -410,34 +573,49 @@ class BaseBot(commands.Bot):
         hoist=False,
         mentionable=False
       )
-      mute_channel_permissions = discord.PermissionOverwrite(
-        create_instant_invite=False, manage_channels=False, manage_roles=False, manage_webhooks=False, view_channel=True,
-        send_messages=False, send_tts_messages=False, manage_messages=False, embed_links=False, 
-        attach_files=False, read_message_history=True, mention_everyone=False, use_external_emojis=False, add_reactions=False,
-        priority_speaker=False, stream=False, connect=False, speak=False, mute_members=False, deafen_members=False,
-        move_members=False, use_voice_activation=False
-      )
-      #Restrict access to channels
-      for channel in guild.channels:
-        try:
-          await channel.set_permissions(mute_role, overwrite=mute_channel_permissions)
-        except:
-          pass
+      #Restrict access to channels, runs in the background and continues after a restart
+      self.permission_jobs.start(guild, mute_role, self.get_mute_overwrite())
 
-  async def on_guild_channel_create(self, channel):
-    mute_permissions = discord.PermissionOverwrite(
+  def get_mute_overwrite(self):
+    # the overwrite of the mute role in every channel
+    return discord.PermissionOverwrite(
       create_instant_invite=False, manage_channels=False, manage_roles=False, manage_webhooks=False, view_channel=True,
       send_messages=False, send_tts_messages=False, manage_messages=False, embed_links=False, 
       attach_files=False, read_message_history=True, mention_everyone=False, use_external_emojis=False, add_reactions=False,
       priority_speaker=False, stream=False, connect=False, speak=False, mute_members=False, deafen_members=False,
       move_members=False, use_voice_activation=False
     )
+
+  async def on_guild_channel_create(self, channel):
+    mute_permissions = self.get_mute_overwrite()
     mute_role = self.get_mute_role(channel.guild)
+    if mute_role is None or not overwrite_differs(channel, mute_role, mute_permissions):
+      return # e.g. synced from the category
     try:
       await channel.set_permissions(mute_role, overwrite=mute_permissions)
     except:
       pass
 
+  async def on_guild_channel_update(self, before, after):
+    self.invalidate_guild_objects(after.guild)
+
+  async def on_guild_channel_delete(self, channel):
+    self.invalidate_guild_objects(channel.guild)
+    self.log_webhooks.invalidate(channel.id)
+
+  async def on_webhooks_update(self, channel):
+    self.log_webhooks.invalidate(channel.id)
+
+  async def on_guild_role_update(self, before, after):
+    self.invalidate_guild_objects(after.guild)
+
+  async def on_guild_role_delete(self, role):
+    self.invalidate_guild_objects(role.guild)
+
+  async def on_member_update(self, before, after):
+    if before.roles != after.roles:
+      self.auth_cache.invalidate_member(after.guild, after)
+
   def adjust_user_stats(self, guild, user, msg, cmd, wrd, rct, own):
     if hasattr(user, "id"):
       id = user.id
@@ -477,25 +655,8 @@ class BaseBot(commands.Bot):
       return # ignores a system message
     if hasattr(message, "guild") and hasattr(message.guild, "id"): #only guild messages are parsed
       if message.content != "":
-        prefix = await self.find_prefix(message)
-        if prefix is not None:
-          prefix_match = re.match(f"({re.escape(prefix)}+)", message.content)
-          if prefix_match is not None: #command found
-            prefix_count = len(prefix_match.group(0))/len(prefix)
-            if prefix_count == 1: #bot commands should not increase words
-              cmd = 1
-              wrd = 0
-            else: #multiple ? are not counted as a command
-              cmd = 0
-              wrd = len(message.content.split())
-          else:
-            prefix_count = 0
-            cmd = 0
-            wrd = len(message.content.split())
-        else: #Prefix is None, if multiple prefixes were not found in the message
-          prefix_count = 0
-          cmd = 0
-          wrd = len(message.content.split())
+        matcher = await self.get_message_prefix_matcher(message)
+        prefix_count, cmd, wrd = count_message(matcher, message.content)
       else: #ignore empty message
         return
       self.adjust_user_stats(message.guild, message.author, 1, cmd, wrd, 0, 0)         
@@ -504,30 +665,120 @@ class BaseBot(commands.Bot):
         await self.process_commands(message)
 
   async def on_guild_join(self, guild):
-    await self.init_bot(guild)
-    self.load_custom_commands(guild)
+    await self.init_guilds([guild])
 
   async def on_ready(self):
+    # on_ready is dispatched again after every reconnect which could not resume the session
+    # the bot is only set up once, a reconnect only initializes the guilds joined in the meantime
+    if getattr(self, "bootstrapped", False):
+      await self.resume()
+    else:
+      await self.bootstrap()
+
+  async def on_resumed(self):
+    self.connection_stats["resumed"] += 1
+
+  async def resume(self):
+    # the guilds which the bootstrap is still initializing are skipped by init_guilds
+    self.connection_stats["ready"] += 1
+    await self.init_guilds([guild for guild in self.guilds if not self.is_initialized(guild)])
+
+  def is_initialized(self, guild):
+    return self.intialized.get(guild.id, False)
+
+  async def init_guilds(self, guilds):
+    # initialize the guilds with at most init_concurrency guilds at the same time, discord.py's http client
+    # waits for the rate limits, the bound keeps the bursts small; the commands of a guild are enabled
+    # (self.intialized) as soon as this guild is initialized
+    # a guild which is queued or initialized by another call (e.g. a reconnect during the bootstrap) is skipped,
+    # a second init_bot at the same time would create the roles and channels twice
+    guilds = [guild for guild in guilds if guild.id not in self.initializing]
+    self.initializing.update(guild.id for guild in guilds)
+    semaphore = asyncio.Semaphore(self.init_concurrency)
+    start = time.perf_counter()
+    timeline = []
+    async def worker(guild):
+      try:
+        async with semaphore:
+          begin = time.perf_counter() - start
+          error = None
+          try:
+            await self.init_bot(guild)
+          except Exception as e:
+            error = e
+            print(f"Could not initialize {guild.name} ({guild.id}): {e}")
+            traceback.print_exc()
+          timeline.append((guild.name, guild.id, begin, time.perf_counter() - start, error))
+      finally:
+        self.initializing.discard(guild.id)
+    await asyncio.gather(*[worker(guild) for guild in guilds])
+    return timeline
+
+  def startup_report(self, slowest=5):
+    report = self.startup_timeline
+    guilds = report["guilds"]
+    lines = [f"Bootstrap in {report['total']:.2f}s: cogs loaded in {report['cogs']:.2f}s, "
+             f"{len(guilds)} guild(s) initialized in {report['init']:.2f}s with {self.init_concurrency} worker(s)"]
+    for name, guild_id, begin, end, error in sorted(guilds, key=lambda x: x[3]-x[2], reverse=True)[:slowest]:
+      lines.append(f"  {name} ({guild_id}): {begin:.2f}s - {end:.2f}s ({end-begin:.2f}s){' FAILED: '+str(error) if error else ''}")
+    failed = sum(1 for guild in guilds if guild[4] is not None)
+    if failed:
+      lines.append(f"  {failed} guild(s) failed")
+    return "\n".join(lines)
+
+  async def bootstrap(self):
+    self.bootstrapped = True # set first, a reconnect during the bootstrap must not start a second one
+    self.connection_stats = {"bootstrap":1, "ready":0, "resumed":0}
     self.intialized = {}
+    self.initializing = set() # the ids of the guilds queued or running in init_guilds
     if not hasattr(self, "db"):
       self.db = {}
     if not hasattr(self, "user_stats"):
       self.user_stats = {}
     if not hasattr(self, "settings"):
       self.settings = {}
+    if not hasattr(self, "resolved_ids"):
+      self.resolved_ids = {}
+    if not hasattr(self, "auth_cache"):
+      self.auth_cache = AuthorizationCache()
+    if not hasattr(self, "custom_commands"):
+      self.custom_commands = {}
+    if not hasattr(self, "rate_limiter"):
+      self.rate_limiter = TokenBucketLimiter()
+    if not hasattr(self, "command_metrics"):
+      self.command_metrics = CommandMetrics()
+    if not hasattr(self, "log_queues"):
+      self.log_queues = {}
+    if not hasattr(self, "error_suppressor"):
+      self.error_suppressor = ErrorSuppressor()
+      asyncio.ensure_future(self.report_suppressed_errors())
+    if not hasattr(self, "event_log"):
+      self.event_log = EventLog(LOG_PATH) # also written if the discord log channels are turned off
+    if not hasattr(self, "log_webhooks"):
+      self.log_webhooks = LogWebhooks()
+    if not hasattr(self, "permission_jobs"):
+      self.permission_jobs = PermissionPropagator(self)
+    if not hasattr(self, "request_scheduler"):
+      self.request_scheduler = RequestScheduler()
+    self.request_scheduler.install(self.http) # first, so the command timing includes the queueing delay
+    install_http_timing(self.http)
     if not hasattr(self, "default_settings"):
       self.initialize_default_settings()
-    for guild in self.guilds:
-      await self.init_bot(guild)
-    #Loading base extensions.
+    start = time.perf_counter()
     @self.check # add a global check to the bot
     def check_initialized(context):
       if context.guild.id not in context.bot.intialized or not context.bot.intialized[context.guild.id]:
         raise commands.CheckFailure("Guild {context.guild.name} is not initialized")
       return True
+    self.before_invoke(self.before_command_invoke)
+    self.after_invoke(self.after_command_invoke)
+    #Loading base extensions first, init_bot initializes the cogs for each guild
     self.load_all_cogs()
-    for guild in self.guilds:
-      self.load_custom_commands(guild) # make sure the custom commands are loaded after cog is loaded
+    cogs_loaded = time.perf_counter()
+    timeline = await self.init_guilds(self.guilds)
+    end = time.perf_counter()
+    self.startup_timeline = {"cogs":cogs_loaded-start, "init":end-cogs_loaded, "total":end-start, "guilds":timeline}
+    print(self.startup_report())
     self.start_at = time.time()
     
   def load_all_cogs(self):
@@ -546,7 +797,10 @@ class BaseBot(commands.Bot):
         traceback.print_exc()
 
   async def on_guild_remove(self, guild):
-    pass # Placeholder
+    self.custom_commands.pop(guild.id, None)
+    log_queue = self.log_queues.pop(guild.id, None)
+    if log_queue is not None and log_queue.task is not None:
+      log_queue.task.cancel()
     
   async def delete_roles(self, guild):
     mod_role = self.get_mod_role(guild)
@@ -605,12 +859,14 @@ class BaseBot(commands.Bot):
     embed = discord.Embed(title="Forced Rename", colour=discord.Colour.blue(), timestamp=context.message.created_at)
     embed.add_field(name=f"{key}:", value=value, inline=False)
     embed.set_footer(text="ADMIN LOG")
-    await self.get_log(context.guild, "admin-log").send(content=None, embed=embed)
+    await self.get_log_queue(context.guild).put("admin-log", embed)
     await role.edit(name=value)
     
   def initialize_default_settings(self):
     bot_name = self.user.name
     self.default_settings = {}
+    self.default_settings["PREFIX"] = DefaultSetting(name="PREFIX", default="?", description="command prefixes (space separated)", 
+      transFun=normalize_prefix_setting, checkFun=lambda x: len(normalize_prefix_setting(x)) > 0, checkDescription="one or more prefixes separated by spaces")
     self.default_settings["MAX_WARNINGS"] = DefaultSetting(name="MAX_WARNINGS", default=4, description="max allowed warnings", 
       transFun=lambda x: int(x), checkFun=lambda x: x>0, checkDescription="a positive integer")
     self.default_settings["WARN_DURATION"] = DefaultSetting(name="WARN_DURATION", default=5, description="warning expiry (day)", 
@@ -644,6 +900,12 @@ class BaseBot(commands.Bot):
       transFun=lambda x: x.upper(), checkFun=lambda x: x in ["ON", "OFF"], checkDescription="either ON or OFF")
     self.default_settings["MOD_LOG"] = DefaultSetting(name="MOD_LOG", default="ON", description="on/off mod logging", 
       transFun=lambda x: x.upper(), checkFun=lambda x: x in ["ON", "OFF"], checkDescription="either ON or OFF")
+    self.default_settings["LOG_WEBHOOK"] = DefaultSetting(name="LOG_WEBHOOK", default="OFF", description="on/off logging through webhooks", 
+      transFun=lambda x: x.upper(), checkFun=lambda x: x in ["ON", "OFF"], checkDescription="either ON or OFF")
+    self.default_settings["MAINTENANCE_LOG"] = DefaultSetting(name="MAINTENANCE_LOG", default="OFF", description="on/off routine task logging", 
+      transFun=lambda x: x.upper(), checkFun=lambda x: x in ["ON", "OFF"], checkDescription="either ON or OFF")
+    self.default_settings["COMMAND_RATES"] = DefaultSetting(name="COMMAND_RATES", default="", 
+      description="rate limits of built-in commands (mods and admins are exempt), e.g. modmail=2/600/user; delete=2/10/channel", transFun=normalize_command_rates, checkDescription="of the form command=rate/per/bucket; ... with bucket user, channel or guild")
     self.default_settings["ACTIVE_TIME"] = DefaultSetting(name="ACTIVE_TIME", default=2, description="interactive message active time", 
       transFun=lambda x: float(x), checkFun=lambda x: x>0, checkDescription="a positive number")
   
@@ -667,11 +929,16 @@ class BaseBot(commands.Bot):
   async def close(self):
     if self.is_closed():
       return
+    await asyncio.gather(*[queue.flush() for queue in getattr(self, "log_queues", {}).values()])
+    await temp_messages.flush()
+    await downloader.close()
     await super().close() # this method unloads all the cogs
     for guild in self.guilds:
       self.update_user_stats(guild)
     for k,db in self.db.items():
       db.close()
+    if hasattr(self, "event_log"):
+      self.event_log.close()
     print("The bot client is completely closed")
 
 if __name__ == "__main__":